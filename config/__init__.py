@@ -1,3 +1,4 @@
+"""
 # Configuration
 
 This module exports centralized configuration.
@@ -0,0 +1,30 @@
+"""
+Shared .env.local loader for the pipeline scripts.
+
+Parses KEY=value lines with one compiled-regex pass (handling the BOM
+that Windows editors often add) and exports them into os.environ. Cached
+so scripts importing each other don't re-read the file.
+"""
+
+import functools
+import os
+import re
+from pathlib import Path
+
+_ENV_LINE_RE = re.compile(r'^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*?)\s*$', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def load_env(env_file: Path | None = None) -> None:
+    """Load KEY=value pairs from .env.local into os.environ."""
+    if env_file is None:
+        env_file = Path(__file__).parent.parent / '.env.local'
+    if not env_file.exists():
+        return
+    # utf-8-sig strips the BOM character that Windows editors often add
+    try:
+        content = env_file.read_text(encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        content = env_file.read_text(encoding='utf-16')
+    for key, value in _ENV_LINE_RE.findall(content):
+        os.environ[key] = value
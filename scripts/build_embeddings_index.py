@@ -7,162 +7,382 @@ Usage:
 This script:
 1. Loads all text responses from clean.csv
 2. Embeds them with Gemini text-embedding-004
-3. Saves to artifacts/embeddings_index.json for RAG search
+3. Saves to artifacts/embeddings_index.json.gz (+ .npz sidecar) for RAG search
 """
 
+import gzip
+import hashlib
 import os
 import json
+import random
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
 import numpy as np
+import orjson
 import pandas as pd
-from pathlib import Path
 
-# Load environment variables (handle Windows encoding issues)
+# Load environment variables (utf-8-sig handles the Windows BOM case)
+from dotenv import load_dotenv
+
 script_dir = Path(__file__).parent.parent
-env_file = script_dir / '.env.local'
-if env_file.exists():
-    try:
-        content = env_file.read_text(encoding='utf-8')
-    except UnicodeDecodeError:
-        content = env_file.read_text(encoding='utf-16')
-    for line in content.strip().split('\n'):
-        line = line.strip()
-        if line and '=' in line and not line.startswith('#'):
-            key, value = line.split('=', 1)
-            os.environ[key.strip()] = value.strip()
+load_dotenv(script_dir / '.env.local', encoding='utf-8-sig')
+
+
+def _get_genai():
+    """Import and configure google.generativeai on first use.
+
+    The SDK import costs ~200ms, so it stays out of module import time for
+    callers that only need load_texts/save_index.
+    """
+    import google.generativeai as genai
+
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment")
+    genai.configure(api_key=api_key)
+    return genai
 
-import google.generativeai as genai
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment")
+# The index only needs the text columns plus two segment fields
+NEEDED_COLS = ['suggestion', 'skip_experience', 'ada_improvement',
+               'arrival_time', 'mode']
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Tokens treated as empty answers, and the minimum substantive length
+NA_TOKENS = frozenset({'nan', 'na', 'n/a', ''})
+MIN_TEXT_LEN = 10
 
 
 def load_texts(csv_path: Path) -> list[dict]:
-    """Load all text responses with metadata."""
+    """Load all text responses with metadata (vectorized, no iterrows)."""
     print(f"Loading {csv_path}...")
+
+    def _read(encoding: str) -> pd.DataFrame:
+        header = pd.read_csv(csv_path, nrows=0, encoding=encoding)
+        usecols = [c for c in NEEDED_COLS if c in header.columns]
+        try:
+            return pd.read_csv(csv_path, usecols=usecols, encoding=encoding,
+                               engine='pyarrow')
+        except (ValueError, ImportError):
+            return pd.read_csv(csv_path, usecols=usecols, encoding=encoding)
+
     try:
-        df = pd.read_csv(csv_path, encoding='utf-8')
+        df = _read('utf-8')
     except UnicodeDecodeError:
-        df = pd.read_csv(csv_path, encoding='latin-1')
-    
+        df = _read('latin-1')
+
+    arrival = df['arrival_time'] if 'arrival_time' in df.columns \
+        else pd.Series('Unknown', index=df.index)
+    mode = df['mode'] if 'mode' in df.columns \
+        else pd.Series('Unknown', index=df.index)
+
+    def extract(col: str, prefix: str, source: str) -> list[dict]:
+        """Filter one text column to substantive responses in a single pass."""
+        s = df[col].astype(str).str.strip()
+        # Skip NA-like tokens and very short responses
+        mask = s.str.len().gt(MIN_TEXT_LEN) & ~s.str.lower().isin(NA_TOKENS)
+        return [
+            {
+                'id': f"{prefix}_{idx}",
+                'text': text,
+                'source': source,
+                'arrival_time': str(a),
+                'mode': str(m),
+            }
+            for idx, text, a, m in zip(s.index[mask], s[mask],
+                                       arrival[mask], mode[mask])
+        ]
+
     texts = []
-    
+
     # Suggestion column (main improvement suggestions)
     if 'suggestion' in df.columns:
-        for idx, row in df.iterrows():
-            text = str(row.get('suggestion', '')).strip()
-            if text and text.lower() not in ['nan', 'na', 'n/a', '']:
-                if len(text) > 10:  # Skip very short responses
-                    texts.append({
-                        'id': f"suggestion_{idx}",
-                        'text': text,
-                        'source': 'suggestion',
-                        'arrival_time': str(row.get('arrival_time', 'Unknown')),
-                        'mode': str(row.get('mode', 'Unknown')),
-                    })
-    
+        texts.extend(extract('suggestion', 'suggestion', 'suggestion'))
+
     # Skip experience column (narratives about skipping class)
     if 'skip_experience' in df.columns:
-        for idx, row in df.iterrows():
-            text = str(row.get('skip_experience', '')).strip()
-            if text and text.lower() not in ['nan', 'na', 'n/a', '']:
-                if len(text) > 10:
-                    texts.append({
-                        'id': f"experience_{idx}",
-                        'text': text,
-                        'source': 'experience',
-                        'arrival_time': str(row.get('arrival_time', 'Unknown')),
-                        'mode': str(row.get('mode', 'Unknown')),
-                    })
-    
+        texts.extend(extract('skip_experience', 'experience', 'experience'))
+
     # ADA improvement column (accessibility feedback)
     if 'ada_improvement' in df.columns:
-        for idx, row in df.iterrows():
-            text = str(row.get('ada_improvement', '')).strip()
-            if text and text.lower() not in ['nan', 'na', 'n/a', '']:
-                if len(text) > 10:
-                    texts.append({
-                        'id': f"ada_{idx}",
-                        'text': text,
-                        'source': 'accessibility',
-                        'arrival_time': str(row.get('arrival_time', 'Unknown')),
-                        'mode': str(row.get('mode', 'Unknown')),
-                    })
-    
+        texts.extend(extract('ada_improvement', 'ada', 'accessibility'))
+
     print(f"  Found {len(texts)} text responses")
     return texts
 
 
-def embed_texts(texts: list[dict], batch_size: int = 20) -> list[dict]:
-    """Embed all texts and add embedding vectors."""
-    print(f"Embedding {len(texts)} texts...")
-    
-    n_batches = (len(texts) + batch_size - 1) // batch_size
-    
-    for i in range(0, len(texts), batch_size):
-        batch_num = i // batch_size + 1
-        print(f"  Batch {batch_num}/{n_batches}")
-        
-        for j in range(i, min(i + batch_size, len(texts))):
-            text = texts[j]['text']
-            
-            # Retry logic with exponential backoff
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
+class RateLimiter:
+    """Token-bucket rate limiter for Gemini API calls.
+
+    Tracks requests and estimated tokens over a sliding 60s window so we
+    stay inside the RPM/TPM quotas instead of sleeping a fixed amount, and
+    gates concurrency with a semaphore so bursts can't trip the limits.
+    """
+
+    def __init__(self, max_rpm: int = 1500, max_tpm: int = 1_000_000,
+                 max_concurrency: int = 4):
+        self.max_rpm = max_rpm
+        self.max_tpm = max_tpm
+        self._requests = deque()  # timestamps of recent requests
+        self._tokens = deque()    # (timestamp, estimated_tokens) pairs
+        self._lock = threading.Lock()
+        self._sem = threading.Semaphore(max_concurrency)
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token estimate: ~4 bytes per token."""
+        return max(1, len(text.encode('utf-8')) // 4)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds to wait before a request of `tokens` fits in the window."""
+        cutoff = now - 60.0
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._tokens.popleft()
+
+        wait = 0.0
+        if len(self._requests) >= self.max_rpm:
+            wait = max(wait, self._requests[0] + 60.0 - now)
+        tokens_used = sum(t for _, t in self._tokens)
+        if tokens_used + tokens > self.max_tpm and self._tokens:
+            wait = max(wait, self._tokens[0][0] + 60.0 - now)
+        return wait
+
+    @contextmanager
+    def reserve(self, tokens: int):
+        """Block until the request fits in the quota, then admit it."""
+        with self._sem:
+            while True:
+                with self._lock:
+                    now = time.time()
+                    wait = self._wait_time(now, tokens)
+                    if wait <= 0:
+                        self._requests.append(now)
+                        self._tokens.append((now, tokens))
+                        break
+                time.sleep(min(wait, 5.0) + random.uniform(0.0, 0.05))
+            yield
+
+
+# Shared across all embedding calls in this process
+_RATE_LIMITER = RateLimiter()
+
+EMBED_MODEL = "models/embedding-001"
+EMBED_DIM = 768
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by sha256(model + normalized text).
+
+    Vectors live in a float32 matrix inside embed_cache.npz with a JSON
+    sidecar mapping key -> row index, so incremental runs only embed
+    new/changed texts. Writes go to a temp file and are os.replace'd into
+    place, so an interrupted run can't corrupt the cache. Texts that fail
+    to embed are logged to embed_cache_missed.json for a later refresh.
+    """
+
+    def __init__(self, cache_dir: Path, flush_every: int = 500):
+        self.matrix_path = cache_dir / 'embed_cache.npz'
+        self.keys_path = cache_dir / 'embed_cache_keys.json'
+        self.missed_path = cache_dir / 'embed_cache_missed.json'
+        self._flush_every = flush_every
+        self._keys: dict[str, int] = {}
+        self._matrix = None
+        self._new_rows: list[np.ndarray] = []
+        self._missed: list[str] = []
+
+        if self.matrix_path.exists() and self.keys_path.exists():
+            try:
+                self._matrix = np.load(self.matrix_path)['embeddings']
+                self._keys = json.loads(self.keys_path.read_text(encoding='utf-8'))
+                print(f"  Loaded embedding cache ({len(self._keys)} entries)")
+            except Exception as e:
+                print(f"  Warning: could not load embedding cache: {e}")
+                self._keys, self._matrix = {}, None
+
+    @staticmethod
+    def key_for(text: str) -> str:
+        normalized = EMBED_MODEL + text.strip().lower()
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        idx = self._keys.get(key)
+        if idx is None:
+            return None
+        cached = len(self._matrix) if self._matrix is not None else 0
+        if idx < cached:
+            return self._matrix[idx]
+        return self._new_rows[idx - cached]
+
+    def add(self, key: str, vector) -> None:
+        if key in self._keys:
+            return
+        self._keys[key] = (len(self._matrix) if self._matrix is not None else 0) + len(self._new_rows)
+        self._new_rows.append(np.asarray(vector, dtype=np.float32))
+        if len(self._new_rows) >= self._flush_every:
+            self.flush()
+
+    def log_miss(self, key: str) -> None:
+        self._missed.append(key)
+
+    def flush(self) -> None:
+        """Atomically persist any new rows (write-to-temp + rename)."""
+        if self._new_rows:
+            new_mat = np.stack(self._new_rows)
+            mat = new_mat if self._matrix is None else np.vstack([self._matrix, new_mat])
+            tmp = self.matrix_path.parent / 'embed_cache.tmp.npz'
+            self.matrix_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(tmp, embeddings=mat)
+            os.replace(tmp, self.matrix_path)
+
+            tmp_keys = self.keys_path.with_suffix('.json.tmp')
+            tmp_keys.write_text(json.dumps(self._keys), encoding='utf-8')
+            os.replace(tmp_keys, self.keys_path)
+
+            self._matrix = mat
+            self._new_rows = []
+
+        if self._missed:
+            self.missed_path.write_text(json.dumps(self._missed), encoding='utf-8')
+
+
+def embed_texts(texts: list[dict], batch_size: int = 20,
+                max_workers: int = 4) -> np.ndarray:
+    """Embed all texts into a preallocated (N, EMBED_DIM) float32 matrix.
+
+    Sends each batch as a single batched embed_content call (the SDK accepts
+    a list of contents) and keeps up to max_workers batches in flight so the
+    API round-trips overlap. The shared rate limiter keeps the concurrent
+    requests inside quota. Vectors are written straight into the matrix
+    instead of per-dict Python lists, so there's one allocation total.
+    """
+    print(f"Embedding {len(texts)} texts in batches of {batch_size}...")
+
+    genai = _get_genai()
+    cache = EmbeddingCache(script_dir / 'artifacts')
+    emb = np.empty((len(texts), EMBED_DIM), dtype=np.float32)
+
+    # Serve cached texts directly; only send cache misses to the API
+    pending = []
+    for row, t in enumerate(texts):
+        key = EmbeddingCache.key_for(t['text'])
+        vector = cache.get(key)
+        if vector is not None:
+            emb[row] = vector
+        else:
+            pending.append((row, key))
+
+    print(f"  Cache hits: {len(texts) - len(pending)}, "
+          f"misses: {len(pending)} (only misses hit the API)")
+    batches = [pending[i:i + batch_size]
+               for i in range(0, len(pending), batch_size)]
+
+    def embed_batch(batch: list) -> list | None:
+        """Embed one batch; returns vectors, or None if the batch failed."""
+        est_tokens = sum(RateLimiter.estimate_tokens(texts[row]['text'])
+                         for row, _ in batch)
+
+        # Retry logic with jittered exponential backoff, around the whole batch
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                with _RATE_LIMITER.reserve(est_tokens):
                     result = genai.embed_content(
-                        model="models/embedding-001",
-                        content=text,
+                        model=EMBED_MODEL,
+                        content=[texts[row]['text'] for row, _ in batch],
                         task_type="retrieval_document"
                     )
-                    texts[j]['embedding'] = result['embedding']
-                    break  # Success
-                    
-                except Exception as e:
-                    error_msg = str(e).lower()
-                    if 'rate' in error_msg or 'quota' in error_msg or '429' in error_msg:
-                        delay = 2.0 * (2 ** attempt)
-                        print(f"    Rate limited, waiting {delay}s...")
-                        time.sleep(delay)
-                    else:
-                        print(f"    Error embedding text: {e}")
-                        # Use zero vector as fallback
-                        texts[j]['embedding'] = [0.0] * 768
-                        break
-            
-            # Small delay between each text to avoid rate limits
-            time.sleep(0.1)
-    
-    return texts
+                return result['embedding']
+
+            except Exception as e:
+                error_msg = str(e).lower()
+                is_rate_limit = 'rate' in error_msg or 'quota' in error_msg or '429' in error_msg
+                if is_rate_limit and attempt < max_retries - 1:
+                    # Jitter spreads retries out so workers don't re-collide
+                    delay = 2.0 * (2 ** attempt) * random.uniform(0.75, 1.25)
+                    print(f"    Rate limited, waiting {delay:.1f}s...")
+                    time.sleep(delay)
+                else:
+                    print(f"    Error embedding batch: {e}")
+                    return None
+        return None
+
+    # Keep several batches in flight; the rate limiter caps the burst rate,
+    # and only the main thread touches the cache
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(embed_batch, b): b for b in batches}
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            vectors = future.result()
+            print(f"  Batch {done}/{len(batches)} ({len(batch)} texts)")
+
+            if vectors is None:
+                # Use zero vectors as fallback; don't cache them
+                for row, key in batch:
+                    emb[row] = 0.0
+                    cache.log_miss(key)
+            else:
+                for (row, key), vector in zip(batch, vectors):
+                    emb[row] = vector
+                    cache.add(key, vector)
+
+    cache.flush()
+    return emb
 
 
-def save_index(texts: list[dict], output_path: Path):
-    """Save embeddings index to JSON."""
+def save_index(texts: list[dict], emb: np.ndarray, output_path: Path):
+    """Save the index as metadata JSON plus a binary embedding sidecar.
+
+    Vectors go into a float16 (N, D) matrix in an .npz next to the JSON —
+    ~30x smaller than JSON floats and loadable without parsing. Consumers
+    read them back with np.load(...)['embeddings'].astype(np.float32).
+
+    Rows are L2-normalized before writing, so cosine similarity downstream
+    reduces to a single dot product (queries @ emb.T) with no per-query
+    re-normalization.
+    """
     print(f"Saving to {output_path}...")
-    
-    # Convert numpy arrays to lists for JSON serialization
-    for t in texts:
-        if 'embedding' in t and isinstance(t['embedding'], np.ndarray):
-            t['embedding'] = t['embedding'].tolist()
-    
+
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # keep zero-vector fallbacks as zeros
+    emb = emb / norms
+
+    mat = emb.astype(np.float16)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Uncompressed .npz stays mmap-friendly; float16 already halves the size
+    npz_path = output_path.with_suffix('.npz')
+    np.savez(npz_path, embeddings=mat)
+
     index = {
         'metadata': {
             'total_texts': len(texts),
-            'embedding_dim': len(texts[0]['embedding']) if texts else 0,
-            'model': 'text-embedding-004',
+            'embedding_dim': int(mat.shape[1]) if len(texts) else 0,
+            'model': EMBED_MODEL,
+            'embeddings_file': npz_path.name,
+            'embedding_dtype': 'float16',
+            'normalized': True,
+            'metric': 'ip',
             'generated_at': pd.Timestamp.now().isoformat(),
         },
         'documents': texts
     }
-    
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(index, f, indent=2)
-    
-    print(f"✅ Saved {len(texts)} documents with embeddings")
+
+    # Gzip the metadata JSON: level 1 is near-free CPU-wise and the text
+    # payload compresses 3-5x
+    gz_path = Path(str(output_path) + '.gz')
+    with gzip.open(gz_path, 'wb', compresslevel=1) as f:
+        f.write(orjson.dumps(
+            index, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2,
+            default=str))
+
+    print(f"✅ Saved {len(texts)} documents to {gz_path.name} "
+          f"+ embeddings sidecar {npz_path.name}")
 
 
 def main():
@@ -173,8 +393,8 @@ def main():
         raise FileNotFoundError(f"Data file not found: {csv_path}")
     
     texts = load_texts(csv_path)
-    texts = embed_texts(texts)
-    save_index(texts, output_path)
+    emb = embed_texts(texts)
+    save_index(texts, emb, output_path)
 
 
 if __name__ == '__main__':
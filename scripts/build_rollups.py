@@ -13,108 +13,204 @@ This script:
 """
 
 import argparse
-import json
 import sys
+from collections import Counter
 from pathlib import Path
 
 import numpy as np
+import orjson
 import pandas as pd
 
 # Fix Windows terminal encoding for emoji/Unicode
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
+# Make the project root importable so config/ resolves when run as a script
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-def compute_pfs(ease: str, minutes: float, skipped: bool) -> float:
+from config.settings import (ARRIVAL_TIME_ORDER, DIFFICULTY_SCORES, EASE_ORDER,
+                             FREQUENCY_ORDER, MINUTES_MAX, PFS_WEIGHTS)
+
+# Only these columns feed the metrics/rankings/segments/ADA rollups
+NEEDED_COLS = [
+    'finished', 'mode', 'frequency', 'ease', 'arrival_time',
+    'rank_spots', 'rank_distance', 'rank_cost', 'rank_security',
+    'rank_navigation', 'rank_other',
+    'minutes_searching', 'skipped_class', 'pay_to_park_sentiment',
+    'crimson_ride_aware', 'crimson_ride_willing',
+    'ada_opted_in', 'ada_satisfaction', 'ada_adequate',
+]
+
+# Low-cardinality survey answers: categories are ~10x smaller than object
+CSV_DTYPES = {
+    'ease': 'category',
+    'mode': 'category',
+    'frequency': 'category',
+    'arrival_time': 'category',
+}
+
+# Columns with a fixed ordering in config; categories follow that ordering
+# so .cat.codes are stable small ints usable for LUT math
+CATEGORY_ORDERS = {
+    'ease': EASE_ORDER,
+    'arrival_time': ARRIVAL_TIME_ORDER,
+    'frequency': FREQUENCY_ORDER,
+}
+
+
+def _apply_category_orders(df: pd.DataFrame) -> pd.DataFrame:
+    """Recast ordered survey columns with their configured category order.
+
+    Unexpected labels in the data are appended after the known ones rather
+    than coerced to NaN, so counts stay lossless.
     """
-    Parking Friction Score (PFS)
-    
+    for col, order in CATEGORY_ORDERS.items():
+        if col not in df.columns:
+            continue
+        observed = pd.Series(df[col].dropna().unique())
+        extras = sorted(str(v) for v in observed if v not in order)
+        df[col] = pd.Categorical(df[col], categories=list(order) + extras,
+                                 ordered=True)
+    return df
+
+
+def read_clean_csv(input_path: Path) -> pd.DataFrame:
+    """Read clean.csv with only the needed columns and explicit dtypes.
+
+    Prefers pyarrow's native multithreaded CSV reader (memory-maps the
+    file, so mostly-ASCII data skips a decode round-trip); falls back to
+    pandas when pyarrow is unavailable or chokes on dirty data.
+    """
+    header = pd.read_csv(input_path, nrows=0)
+    usecols = [c for c in NEEDED_COLS if c in header.columns]
+    try:
+        import pyarrow.csv as pv
+        table = pv.read_csv(
+            input_path,
+            read_options=pv.ReadOptions(use_threads=True),
+            convert_options=pv.ConvertOptions(include_columns=usecols,
+                                              strings_can_be_null=True))
+        df = table.to_pandas()
+        for col in CSV_DTYPES:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+    except (ValueError, ImportError, OSError):
+        dtypes = {c: t for c, t in CSV_DTYPES.items() if c in usecols}
+        try:
+            df = pd.read_csv(input_path, usecols=usecols, dtype=dtypes,
+                             engine='pyarrow')
+        except (ValueError, ImportError):
+            # pyarrow unavailable, or dtype coercion failed on dirty data
+            df = pd.read_csv(input_path, usecols=usecols)
+    return _apply_category_orders(df)
+
+
+def compute_pfs(df: pd.DataFrame) -> np.ndarray:
+    """
+    Parking Friction Score (PFS), vectorized over the whole DataFrame.
+
     PFS = 0.35 * difficulty_score + 0.35 * minutes_norm + 0.30 * skip_score
-    
+
     Range: 0.0 (no friction) to 1.0 (max friction)
     """
-    difficulty_map = {
-        "Very Easy": 0.0, "Easy": 0.25, "Neutral": 0.50,
-        "Difficult": 0.75, "Very Difficult": 1.0
-    }
-    difficulty_score = difficulty_map.get(ease, 0.5)
-    
-    # Normalize minutes (0-45 range clamped)
-    if pd.isna(minutes):
-        minutes_norm = 0.5  # default if missing
+    ease = df['ease']
+    if isinstance(ease.dtype, pd.CategoricalDtype):
+        # LUT indexed by category code; NaN codes to -1, which hits the
+        # trailing 0.5 default slot
+        lut = np.array([DIFFICULTY_SCORES.get(c, 0.5)
+                        for c in ease.cat.categories] + [0.5])
+        diff = lut[ease.cat.codes.to_numpy()]
     else:
-        minutes_norm = min(float(minutes) / 45.0, 1.0)
-    
+        diff = ease.map(DIFFICULTY_SCORES).fillna(0.5).to_numpy()
+
+    # Normalize minutes (0-45 range clamped; 0.5 default if missing)
+    mins = pd.to_numeric(df['minutes_searching'], errors='coerce').to_numpy(dtype=float)
+    mins_norm = np.where(np.isnan(mins), 0.5, np.clip(mins / MINUTES_MAX, 0.0, 1.0))
+
     # Skip: binary
-    skip_score = 1.0 if skipped else 0.0
-    
-    return 0.35 * difficulty_score + 0.35 * minutes_norm + 0.30 * skip_score
+    if 'skipped_class' in df.columns:
+        skip = df['skipped_class'].fillna(False).astype(float).to_numpy()
+    else:
+        skip = np.zeros(len(df))
+
+    return (PFS_WEIGHTS['difficulty'] * diff
+            + PFS_WEIGHTS['minutes'] * mins_norm
+            + PFS_WEIGHTS['skip'] * skip)
+
+
+def _rate(series: pd.Series) -> dict:
+    """n/N/pct rate block from a single traversal of the column."""
+    s = series.dropna()
+    n, total = int(s.sum()), int(len(s))
+    return {
+        'n': n,
+        'N': total,
+        'pct': round(n / total * 100, 1) if total > 0 else 0
+    }
+
+
+def _distribution(series: pd.Series) -> tuple[dict, int]:
+    """Value counts and non-NA total from a single traversal."""
+    vc = series.value_counts(dropna=True)
+    # Ordered categoricals report unused categories as zero rows; drop them
+    vc = vc[vc > 0]
+    return vc.to_dict(), int(vc.sum())
 
 
 def compute_metrics(df: pd.DataFrame) -> dict:
     """Compute all metrics with n/N denominators."""
     metrics = {}
-    
+
     # Total responses
     total = len(df)
     completed = df['finished'].sum() if 'finished' in df.columns else total
     metrics['total_responses'] = {'n': total, 'completed': int(completed)}
-    
+
     # Mode distribution
     if 'mode' in df.columns:
-        mode_counts = df['mode'].value_counts().to_dict()
-        mode_total = df['mode'].notna().sum()
+        mode_counts, mode_total = _distribution(df['mode'])
         metrics['mode_distribution'] = {
             'counts': mode_counts,
-            'total': int(mode_total)
+            'total': mode_total
         }
-    
+
     # Frequency distribution
     if 'frequency' in df.columns:
-        freq_counts = df['frequency'].value_counts().to_dict()
-        freq_total = df['frequency'].notna().sum()
+        freq_counts, freq_total = _distribution(df['frequency'])
         metrics['frequency_distribution'] = {
             'counts': freq_counts,
-            'total': int(freq_total)
+            'total': freq_total
         }
-    
+
     # Ease distribution
     if 'ease' in df.columns:
-        ease_counts = df['ease'].value_counts().to_dict()
-        ease_total = df['ease'].notna().sum()
-        
+        ease_counts, ease_total = _distribution(df['ease'])
+
         # Compute difficulty rate
         difficult = ease_counts.get('Difficult', 0) + ease_counts.get('Very Difficult', 0)
-        
+
         metrics['ease_distribution'] = {
             'counts': ease_counts,
-            'total': int(ease_total),
+            'total': ease_total,
             'difficult_rate': {
                 'n': int(difficult),
-                'N': int(ease_total),
+                'N': ease_total,
                 'pct': round(difficult / ease_total * 100, 1) if ease_total > 0 else 0
             }
         }
-    
+
     # Arrival time distribution
     if 'arrival_time' in df.columns:
-        arrival_counts = df['arrival_time'].value_counts().to_dict()
-        arrival_total = df['arrival_time'].notna().sum()
+        arrival_counts, arrival_total = _distribution(df['arrival_time'])
         metrics['arrival_distribution'] = {
             'counts': arrival_counts,
-            'total': int(arrival_total)
+            'total': arrival_total
         }
-    
+
     # Skip rate
     if 'skipped_class' in df.columns:
-        skipped = df['skipped_class'].sum()
-        skip_total = df['skipped_class'].notna().sum()
-        metrics['skip_rate'] = {
-            'n': int(skipped),
-            'N': int(skip_total),
-            'pct': round(skipped / skip_total * 100, 1) if skip_total > 0 else 0
-        }
-    
+        metrics['skip_rate'] = _rate(df['skipped_class'])
+
     # Minutes searching stats
     if 'minutes_searching' in df.columns:
         minutes = pd.to_numeric(df['minutes_searching'], errors='coerce')
@@ -126,38 +222,152 @@ def compute_metrics(df: pd.DataFrame) -> dict:
             'max': round(valid_minutes.max(), 1) if len(valid_minutes) > 0 else None,
             'n': int(len(valid_minutes))
         }
-    
+
     # Pay-to-park sentiment
     if 'pay_to_park_sentiment' in df.columns:
-        ptp_counts = df['pay_to_park_sentiment'].value_counts().to_dict()
-        ptp_total = df['pay_to_park_sentiment'].notna().sum()
+        ptp_counts, ptp_total = _distribution(df['pay_to_park_sentiment'])
         metrics['pay_to_park_sentiment'] = {
             'counts': ptp_counts,
-            'total': int(ptp_total)
+            'total': ptp_total
         }
-    
+
     # Crimson Ride awareness and willingness
     if 'crimson_ride_aware' in df.columns:
-        aware = df['crimson_ride_aware'].sum()
-        aware_total = df['crimson_ride_aware'].notna().sum()
-        metrics['crimson_ride_awareness'] = {
-            'n': int(aware),
-            'N': int(aware_total),
-            'pct': round(aware / aware_total * 100, 1) if aware_total > 0 else 0
-        }
-    
+        metrics['crimson_ride_awareness'] = _rate(df['crimson_ride_aware'])
+
     if 'crimson_ride_willing' in df.columns:
-        willing = df['crimson_ride_willing'].sum()
-        willing_total = df['crimson_ride_willing'].notna().sum()
-        metrics['crimson_ride_willingness'] = {
-            'n': int(willing),
-            'N': int(willing_total),
-            'pct': round(willing / willing_total * 100, 1) if willing_total > 0 else 0
-        }
-    
+        metrics['crimson_ride_willingness'] = _rate(df['crimson_ride_willing'])
+
     return metrics
 
 
+# Columns the rankings/segments/ADA stages still need as full columns
+SLIM_COLS = [
+    'ease', 'minutes_searching', 'skipped_class', 'arrival_time', 'mode',
+    'frequency', 'rank_spots', 'rank_distance', 'rank_cost', 'rank_security',
+    'rank_navigation', 'rank_other',
+    'ada_opted_in', 'ada_satisfaction', 'ada_adequate',
+]
+
+# Categorical distribution columns: csv column -> metrics key
+_DIST_COLS = {
+    'mode': 'mode_distribution',
+    'frequency': 'frequency_distribution',
+    'arrival_time': 'arrival_distribution',
+    'pay_to_park_sentiment': 'pay_to_park_sentiment',
+}
+
+# Boolean rate columns: csv column -> metrics key
+_RATE_COLS = {
+    'skipped_class': 'skip_rate',
+    'crimson_ride_aware': 'crimson_ride_awareness',
+    'crimson_ride_willing': 'crimson_ride_willingness',
+}
+
+
+def compute_metrics_streaming(chunks) -> tuple[dict, pd.DataFrame]:
+    """Accumulate metrics over CSV chunks instead of one big DataFrame.
+
+    Keeps running counters per column and retains only the slim set of
+    columns the rankings/segments/ADA stages need, so peak memory stays
+    O(chunk) for the wide part of the file. Produces the same metrics
+    dict as compute_metrics.
+    """
+    total = 0
+    completed = 0
+    has_finished = False
+    dist_counts: dict[str, Counter] = {}
+    dist_totals: Counter = Counter()
+    rate_n: Counter = Counter()
+    rate_total: Counter = Counter()
+    ease_seen = False
+    rate_seen: set[str] = set()
+    minutes_parts: list[np.ndarray] = []
+    minutes_seen = False
+    slim_parts: list[pd.DataFrame] = []
+
+    for chunk in chunks:
+        total += len(chunk)
+        if 'finished' in chunk.columns:
+            has_finished = True
+            completed += chunk['finished'].sum()
+
+        for col in list(_DIST_COLS) + ['ease']:
+            if col not in chunk.columns:
+                continue
+            if col == 'ease':
+                ease_seen = True
+            dist_counts.setdefault(col, Counter()).update(
+                chunk[col].value_counts().to_dict())
+            dist_totals[col] += int(chunk[col].notna().sum())
+
+        for col in _RATE_COLS:
+            if col not in chunk.columns:
+                continue
+            rate_seen.add(col)
+            rate_n[col] += int(chunk[col].sum())
+            rate_total[col] += int(chunk[col].notna().sum())
+
+        if 'minutes_searching' in chunk.columns:
+            minutes_seen = True
+            vals = pd.to_numeric(chunk['minutes_searching'], errors='coerce').dropna()
+            if len(vals):
+                minutes_parts.append(vals.to_numpy(dtype=float))
+
+        slim = [c for c in SLIM_COLS if c in chunk.columns]
+        slim_parts.append(chunk[slim])
+
+    metrics = {
+        'total_responses': {
+            'n': total,
+            'completed': int(completed) if has_finished else total,
+        }
+    }
+
+    for col, key in _DIST_COLS.items():
+        if col in dist_counts:
+            metrics[key] = {
+                'counts': dict(dist_counts[col].most_common()),
+                'total': dist_totals[col],
+            }
+
+    if ease_seen:
+        ease_counts = dist_counts.get('ease', Counter())
+        ease_total = dist_totals['ease']
+        difficult = ease_counts.get('Difficult', 0) + ease_counts.get('Very Difficult', 0)
+        metrics['ease_distribution'] = {
+            'counts': dict(ease_counts.most_common()),
+            'total': ease_total,
+            'difficult_rate': {
+                'n': int(difficult),
+                'N': ease_total,
+                'pct': round(difficult / ease_total * 100, 1) if ease_total > 0 else 0
+            }
+        }
+
+    for col, key in _RATE_COLS.items():
+        if col in rate_seen:
+            n, N = rate_n[col], rate_total[col]
+            metrics[key] = {
+                'n': n,
+                'N': N,
+                'pct': round(n / N * 100, 1) if N > 0 else 0
+            }
+
+    if minutes_seen:
+        valid_minutes = np.concatenate(minutes_parts) if minutes_parts else np.array([])
+        metrics['minutes_searching'] = {
+            'mean': round(float(valid_minutes.mean()), 1) if len(valid_minutes) > 0 else None,
+            'median': round(float(np.median(valid_minutes)), 1) if len(valid_minutes) > 0 else None,
+            'min': round(float(valid_minutes.min()), 1) if len(valid_minutes) > 0 else None,
+            'max': round(float(valid_minutes.max()), 1) if len(valid_minutes) > 0 else None,
+            'n': int(len(valid_minutes))
+        }
+
+    slim_df = pd.concat(slim_parts, ignore_index=True) if slim_parts else pd.DataFrame()
+    return metrics, slim_df
+
+
 def compute_rankings(df: pd.DataFrame) -> dict:
     """Compute weighted priority scores for challenge rankings."""
     ranking_cols = {
@@ -169,104 +379,96 @@ def compute_rankings(df: pd.DataFrame) -> dict:
         'rank_other': 'Other'
     }
     
+    present = [c for c in ranking_cols if c in df.columns]
+    if not present:
+        return {}
+
+    # Coerce the whole ranking block once: (N, n_cols) float matrix
+    R = df[present].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    valid = ~np.isnan(R)
+    totals = valid.sum(axis=0)
+
+    # Per-column counts for every rank value that appears in the block
+    values = np.unique(R[valid]).astype(int) if valid.any() else np.array([], dtype=int)
+    counts = {int(v): (R == v).sum(axis=0) for v in values}
+
+    zeros = np.zeros(len(present), dtype=int)
+    c1 = counts.get(1, zeros)
+    c2 = counts.get(2, zeros)
+    c3 = counts.get(3, zeros)
+
+    # Weighted priority score: 3*rank1 + 2*rank2 + 1*rank3
+    weighted = 3 * c1 + 2 * c2 + c3
+    top3 = c1 + c2 + c3
+
+    # Order labels by weighted score descending
     rankings = {}
-    
-    for col, label in ranking_cols.items():
-        if col not in df.columns:
-            continue
-        
-        # Clean and get rank counts
-        ranks = pd.to_numeric(df[col], errors='coerce').dropna()
-        rank_counts = ranks.value_counts().to_dict()
-        
-        # Count how many ranked this in top 3
-        top3_count = sum(rank_counts.get(r, 0) for r in [1, 2, 3])
-        total_ranked = len(ranks)
-        
-        # Weighted priority score: 3*rank1 + 2*rank2 + 1*rank3
-        weighted_score = (
-            3 * rank_counts.get(1, 0) +
-            2 * rank_counts.get(2, 0) +
-            1 * rank_counts.get(3, 0)
-        )
-        
+    for j in np.argsort(-weighted, kind='stable'):
+        label = ranking_cols[present[j]]
+        total_ranked = int(totals[j])
         rankings[label] = {
-            'rank_counts': {int(k): int(v) for k, v in rank_counts.items()},
-            'weighted_score': int(weighted_score),
-            'top3_count': int(top3_count),
-            'top3_pct': round(top3_count / total_ranked * 100, 1) if total_ranked > 0 else 0,
-            'total_ranked': int(total_ranked)
+            'rank_counts': {v: int(counts[v][j]) for v in counts if counts[v][j] > 0},
+            'weighted_score': int(weighted[j]),
+            'top3_count': int(top3[j]),
+            'top3_pct': round(top3[j] / total_ranked * 100, 1) if total_ranked > 0 else 0,
+            'total_ranked': total_ranked
         }
-    
-    # Sort by weighted score
-    rankings = dict(sorted(rankings.items(), key=lambda x: x[1]['weighted_score'], reverse=True))
-    
+
     return rankings
 
 
 def compute_segments(df: pd.DataFrame) -> dict:
     """Compute PFS and skip rate by segment."""
     segments = {}
-    
-    # First, compute PFS for each response
-    # Vectorized PFS computation (no row-by-row .apply)
-    df = df.copy()
-    difficulty_map = {
-        "Very Easy": 0.0, "Easy": 0.25, "Neutral": 0.50,
-        "Difficult": 0.75, "Very Difficult": 1.0
-    }
-    df['_diff_score'] = df['ease'].map(difficulty_map).fillna(0.5)
-    df['_minutes_norm'] = np.clip(
-        pd.to_numeric(df['minutes_searching'], errors='coerce').fillna(22.5) / 45.0,
-        0.0, 1.0
-    )
-    df['_skip_score'] = df['skipped_class'].fillna(False).astype(float)
-    df['pfs'] = 0.35 * df['_diff_score'] + 0.35 * df['_minutes_norm'] + 0.30 * df['_skip_score']
-    
+
+    # PFS as a standalone Series — no DataFrame copy just to hang one
+    # derived column off the caller's frame
+    pfs = pd.Series(compute_pfs(df), index=df.index)
+
+    # Coerce shared columns once instead of per group
+    mins = pd.to_numeric(df['minutes_searching'], errors='coerce') \
+        if 'minutes_searching' in df.columns else None
+    skip = df['skipped_class'].fillna(False).astype(float) \
+        if 'skipped_class' in df.columns else None
+
+    def segment_by(col: str, include_minutes: bool = False) -> dict:
+        """One groupby.agg per segmentation instead of a Python loop over groups."""
+        spec = {'n': ('pfs', 'size'), 'avg_pfs': ('pfs', 'mean')}
+        frame = pd.DataFrame({'pfs': pfs, col: df[col]})
+        if skip is not None:
+            frame['skip'] = skip
+            spec['skip_rate'] = ('skip', 'mean')
+        if include_minutes and mins is not None:
+            frame['mins'] = mins
+            spec['avg_minutes'] = ('mins', 'mean')
+
+        agg = frame.groupby(col, observed=True).agg(**spec)
+
+        result = {}
+        for key, row in agg.iterrows():
+            entry = {
+                'n': int(row['n']),
+                'avg_pfs': round(row['avg_pfs'], 3),
+                'skip_rate': round(row['skip_rate'] * 100, 1) if skip is not None else None,
+            }
+            if include_minutes:
+                entry['avg_minutes'] = round(row['avg_minutes'], 1) \
+                    if mins is not None and pd.notna(row['avg_minutes']) else None
+            result[key] = entry
+        return result
+
     # By arrival time
     if 'arrival_time' in df.columns:
-        arrival_segments = {}
-        for arrival, group in df.groupby('arrival_time'):
-            if pd.isna(arrival):
-                continue
-            skip_col = group['skipped_class'].fillna(False) if 'skipped_class' in group else pd.Series(dtype=float)
-            minutes_col = pd.to_numeric(group['minutes_searching'], errors='coerce')
-            arrival_segments[arrival] = {
-                'n': int(len(group)),
-                'avg_pfs': round(group['pfs'].mean(), 3),
-                'skip_rate': round(skip_col.mean() * 100, 1) if len(skip_col) > 0 else None,
-                'avg_minutes': round(minutes_col.mean(), 1) if minutes_col.notna().any() else None
-            }
-        segments['by_arrival_time'] = arrival_segments
-    
+        segments['by_arrival_time'] = segment_by('arrival_time', include_minutes=True)
+
     # By mode
     if 'mode' in df.columns:
-        mode_segments = {}
-        for mode, group in df.groupby('mode'):
-            if pd.isna(mode):
-                continue
-            skip_col = group['skipped_class'].fillna(False) if 'skipped_class' in group else pd.Series(dtype=float)
-            mode_segments[mode] = {
-                'n': int(len(group)),
-                'avg_pfs': round(group['pfs'].mean(), 3),
-                'skip_rate': round(skip_col.mean() * 100, 1) if len(skip_col) > 0 else None
-            }
-        segments['by_mode'] = mode_segments
-    
+        segments['by_mode'] = segment_by('mode')
+
     # By frequency
     if 'frequency' in df.columns:
-        freq_segments = {}
-        for freq, group in df.groupby('frequency'):
-            if pd.isna(freq):
-                continue
-            skip_col = group['skipped_class'].fillna(False) if 'skipped_class' in group else pd.Series(dtype=float)
-            freq_segments[freq] = {
-                'n': int(len(group)),
-                'avg_pfs': round(group['pfs'].mean(), 3),
-                'skip_rate': round(skip_col.mean() * 100, 1) if len(skip_col) > 0 else None
-            }
-        segments['by_frequency'] = freq_segments
-    
+        segments['by_frequency'] = segment_by('frequency')
+
     return segments
 
 
@@ -300,28 +502,39 @@ def compute_ada_metrics(df: pd.DataFrame) -> dict:
     return ada
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Build metrics and theme rollups')
-    parser.add_argument('--input', '-i', required=True, help='Path to clean.csv')
-    parser.add_argument('--output', '-o', required=True, help='Output directory for artifacts')
-    args = parser.parse_args()
-    
+def run(args) -> int:
+    """Build all rollups; returns a process-style exit code.
+
+    Callable in-process (e.g. from refresh_data.py) with any namespace
+    exposing .input, .output and .chunksize.
+    """
     input_path = Path(args.input)
     output_dir = Path(args.output)
-    
+
     if not input_path.exists():
         print(f"Error: Input file not found: {input_path}")
-        return
-    
+        return 1
+
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    print(f"Loading {input_path}...")
-    df = pd.read_csv(input_path)
-    print(f"  Loaded {len(df)} rows")
-    
-    # Compute metrics
-    print("\nComputing metrics...")
-    metrics = compute_metrics(df)
+    if args.chunksize > 0:
+        # Stream the CSV: metrics accumulate per chunk, and only the slim
+        # columns needed by the later stages are retained in memory
+        print(f"Loading {input_path} in chunks of {args.chunksize}...")
+        header = pd.read_csv(input_path, nrows=0)
+        usecols = [c for c in NEEDED_COLS if c in header.columns]
+        chunks = pd.read_csv(input_path, usecols=usecols, chunksize=args.chunksize)
+        print("\nComputing metrics...")
+        metrics, df = compute_metrics_streaming(chunks)
+        print(f"  Streamed {metrics['total_responses']['n']} rows")
+    else:
+        print(f"Loading {input_path}...")
+        df = read_clean_csv(input_path)
+        print(f"  Loaded {len(df)} rows")
+
+        # Compute metrics
+        print("\nComputing metrics...")
+        metrics = compute_metrics(df)
     
     # Compute rankings
     print("Computing rankings...")
@@ -348,10 +561,12 @@ def main():
         'ada': ada
     }
     
-    # Save
+    # Save (orjson serializes numpy scalars/arrays natively)
     output_file = output_dir / 'metrics.json'
-    with open(output_file, 'w') as f:
-        json.dump(output, f, indent=2, default=str)
+    output_file.write_bytes(orjson.dumps(
+        output, option=(orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2
+                | orjson.OPT_NON_STR_KEYS),
+        default=str))
     
     print(f"\n✅ Saved metrics to {output_file}")
     
@@ -366,6 +581,16 @@ def main():
     if rankings:
         top = list(rankings.keys())[0]
         print(f"  Top challenge: {top} (score: {rankings[top]['weighted_score']})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build metrics and theme rollups')
+    parser.add_argument('--input', '-i', required=True, help='Path to clean.csv')
+    parser.add_argument('--output', '-o', required=True, help='Output directory for artifacts')
+    parser.add_argument('--chunksize', type=int, default=0,
+                        help='Stream the CSV in chunks of this many rows (0 = load at once)')
+    sys.exit(run(parser.parse_args()))
 
 
 if __name__ == '__main__':
@@ -15,38 +15,40 @@ This script:
 """
 
 import argparse
+import hashlib
 import json
 import os
+import random
+import re
+import sqlite3
 import sys
+import threading
 import time
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
+import orjson
 import pandas as pd
+import requests
 from dotenv import load_dotenv
-from sklearn.cluster import KMeans
+from joblib import Parallel, delayed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 
 # Fix Windows terminal encoding for emoji/Unicode
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
-# Load environment variables (handle Windows encoding issues)
+# Load environment variables (shared loader handles Windows encodings)
 from pathlib import Path
+
+from _env import load_env
+
 script_dir = Path(__file__).parent.parent
-env_file = script_dir / '.env.local'
-if env_file.exists():
-    # Read with utf-8-sig to handle BOM character that Windows editors often add
-    try:
-        content = env_file.read_text(encoding='utf-8-sig')
-    except UnicodeDecodeError:
-        content = env_file.read_text(encoding='utf-16')
-    for line in content.strip().split('\n'):
-        line = line.strip()
-        if line and '=' in line and not line.startswith('#'):
-            key, value = line.split('=', 1)
-            os.environ[key.strip()] = value.strip()
+load_env()
 
 # Check for API key
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -59,141 +61,482 @@ import google.generativeai as genai
 
 genai.configure(api_key=GEMINI_API_KEY)
 
+# gemini-embedding-001 defaults to 3072 dims; every embed request asks
+# for this size via outputDimensionality (truncated embeddings need the
+# re-normalization main() already does)
+EMB_DIM = 768
+
+# Strips leading numbering like "1." / "2):" from LLM label lines
+_NUM_PREFIX_RE = re.compile(r'^\d+[\.\):\s]+')
+
+# Lazy token bucket for the embedding quota: concurrent workers space
+# their requests to the RPM limit and sleep only when actually ahead of it
+_RPM_LIMIT = 3000
+_rpm_lock = threading.Lock()
+_last_request_at = 0.0
+
+
+def _pace_request() -> None:
+    global _last_request_at
+    min_interval = 60.0 / _RPM_LIMIT
+    with _rpm_lock:
+        now = time.monotonic()
+        wait = _last_request_at + min_interval - now
+        if wait > 0:
+            time.sleep(wait)
+            now = time.monotonic()
+        _last_request_at = now
+
+# One keep-alive pool for every Gemini REST call; urllib3 retries 429/5xx
+# with backoff (honoring Retry-After), so callers don't hand-roll loops.
+# POST must be opted into allowed_methods — urllib3's default excludes it,
+# and every Gemini call here is a POST (the endpoints are idempotent)
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(
+        total=3, backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({'POST'}) | Retry.DEFAULT_ALLOWED_METHODS)))
+
 
 def load_text_data(csv_path: Path) -> pd.DataFrame:
     """Load and filter text responses (vectorized for performance)."""
     print(f"Loading {csv_path}...")
+
+    needed = ['id', 'suggestion', 'skip_experience', 'arrival_time',
+              'mode', 'frequency', 'skipped_class']
+
+    def _read(encoding: str) -> pd.DataFrame:
+        header = pd.read_csv(csv_path, nrows=0, encoding=encoding)
+        usecols = [c for c in needed if c in header.columns]
+        try:
+            return pd.read_csv(csv_path, usecols=usecols, encoding=encoding,
+                               engine='pyarrow')
+        except (ValueError, ImportError):
+            return pd.read_csv(csv_path, usecols=usecols, encoding=encoding)
+
     # Try UTF-8 first, fall back to latin-1 for Windows files
     try:
-        df = pd.read_csv(csv_path, encoding='utf-8')
+        df = _read('utf-8')
     except UnicodeDecodeError:
-        df = pd.read_csv(csv_path, encoding='latin-1')
+        df = _read('latin-1')
     
     # Vectorized text extraction — no iterrows()
     suggestion = df.get('suggestion', pd.Series(dtype=str)).fillna('').astype(str)
     experience = df.get('skip_experience', pd.Series(dtype=str)).fillna('').astype(str)
     
-    # Prefer suggestion if > 15 chars, else fall back to experience
-    use_suggestion = suggestion.str.len() > 15
+    # Prefer suggestion if > 15 chars, else fall back to experience.
+    # Lengths are computed once per column and combined, instead of a
+    # third scan over the merged text.
+    slen = suggestion.str.len().to_numpy()
+    elen = experience.str.len().to_numpy()
+    use_suggestion = pd.Series(slen > 15, index=df.index)
     text = suggestion.where(use_suggestion, experience)
     source = pd.Series('suggestion', index=df.index).where(use_suggestion, 'experience')
-    
-    # Filter to substantive responses
-    mask = text.str.len() > 15
-    
+
+    # Filter to substantive responses: slice each column down to the kept
+    # rows first, so no full-length aligned Series is built only to be
+    # masked away
+    keep = np.flatnonzero(np.where(slen > 15, slen, elen) > 15)
+
+    def take(col: str, fill=None) -> np.ndarray:
+        if col not in df.columns:
+            return np.full(len(keep), np.nan if fill is None else fill)
+        s = df[col].iloc[keep]
+        if fill is not None:
+            s = s.fillna(fill)
+        return s.to_numpy()
+
     result = pd.DataFrame({
-        'id': df.get('id', pd.Series(dtype=str)),
-        'text': text,
-        'source': source,
-        'arrival_time': df.get('arrival_time', pd.Series(dtype=str)).fillna(''),
-        'mode': df.get('mode', pd.Series(dtype=str)).fillna(''),
-        'frequency': df.get('frequency', pd.Series(dtype=str)).fillna(''),
-        'skipped_class': df.get('skipped_class', pd.Series(dtype=bool)).fillna(False),
-    })[mask].reset_index(drop=True)
-    
+        'id': take('id'),
+        'text': text.to_numpy()[keep],
+        'source': source.to_numpy()[keep],
+        'arrival_time': take('arrival_time', ''),
+        'mode': take('mode', ''),
+        'frequency': take('frequency', ''),
+        'skipped_class': take('skipped_class', False),
+    }, copy=False)
+
+    # Low-cardinality segment columns as categories: smaller, and the
+    # groupby/value_counts rollups run on codes instead of strings
+    for c in ('arrival_time', 'mode', 'frequency', 'source'):
+        result[c] = result[c].astype('category')
+
     print(f"  Found {len(result)} substantive text responses")
     return result
 
 
-def embed_texts(texts: list[str], batch_size: int = 100) -> np.ndarray:
-    """Embed texts using Gemini REST API directly (avoids deprecated SDK issues)."""
-    import requests as req
-    
-    print(f"Embedding {len(texts)} texts in batches of {batch_size}...")
-    embeddings = []
-    total_batches = (len(texts) - 1) // batch_size + 1
+class EmbeddingCache:
+    """SQLite-backed embedding cache keyed by sha256(model + "\\x00" + text).
+
+    Vectors are stored as float32 blobs, so incremental runs only pay API
+    cost for new or changed rows. sqlite3 is stdlib, handles concurrent
+    runs, and one file scales fine to the tens of thousands of texts a
+    survey will ever produce.
+    """
+
+    def __init__(self, db_path: Path, model: str, dim: int = EMB_DIM):
+        self.model = model
+        self.dim = dim
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        # WAL keeps the post-embed write batch cheap and readers unblocked
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb "
+            "(key TEXT PRIMARY KEY, model TEXT, dim INT, vec BLOB)")
+
+    def key_for(self, text: str) -> str:
+        raw = (self.model + "\x00" + text).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Fetch cached vectors for the given keys (missing keys absent)."""
+        out = {}
+        # SQLite caps bound parameters per statement, so chunk the IN list
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk)
+            for key, blob in rows:
+                out[key] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def put(self, vectors: dict[str, np.ndarray]) -> None:
+        rows = [(k, self.model, self.dim,
+                 np.asarray(v, dtype=np.float32).tobytes())
+                for k, v in vectors.items()]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO emb VALUES (?, ?, ?, ?)", rows)
+        self._conn.commit()
+
+
+def embed_texts_batch_mode(texts: list[str],
+                           embed_model: str = "gemini-embedding-001",
+                           poll_interval: int = 15) -> Optional[np.ndarray]:
+    """Embed via the Gemini Batch Mode API (50% cost, one job instead of
+    N/100 round-trips).
+
+    Submits a single JSONL job, polls until it finishes, and reassembles
+    the vectors in key order. Batch jobs can take minutes to be scheduled,
+    so this is opt-in (--batch). Returns None when the google-genai client
+    isn't installed or the job fails, so the caller can fall back to the
+    synchronous path.
+    """
+    try:
+        from google import genai as genai_client
+    except ImportError:
+        print("  google-genai not installed; falling back to sync embedding")
+        return None
+
+    import tempfile
+
+    print(f"Submitting batch embedding job for {len(texts)} texts...")
+    client = genai_client.Client(api_key=GEMINI_API_KEY)
+
+    lines = [
+        json.dumps({
+            "key": f"row_{i}",
+            "request": {
+                "model": f"models/{embed_model}",
+                "content": {"parts": [{"text": text}]},
+                "taskType": "CLUSTERING",
+            },
+        })
+        for i, text in enumerate(texts)
+    ]
+
+    try:
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False,
+                                         encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+            jsonl_path = f.name
+
+        uploaded = client.files.upload(
+            file=jsonl_path,
+            config={'mime_type': 'application/jsonl'})
+        job = client.batches.create(
+            model=embed_model, src=uploaded.name,
+            config={'display_name': 'themes-embed'})
+
+        terminal = {'JOB_STATE_SUCCEEDED', 'JOB_STATE_FAILED',
+                    'JOB_STATE_CANCELLED'}
+        while job.state.name not in terminal:
+            print(f"  Batch job {job.state.name}, polling in {poll_interval}s...")
+            time.sleep(poll_interval)
+            job = client.batches.get(name=job.name)
+
+        if job.state.name != 'JOB_STATE_SUCCEEDED':
+            print(f"  Batch job ended in {job.state.name}; falling back")
+            return None
+
+        result_bytes = client.files.download(file=job.dest.file_name)
+        by_key = {}
+        for line in result_bytes.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            values = rec['response']['embedding']['values']
+            by_key[rec['key']] = values
+
+        return np.asarray([by_key[f"row_{i}"] for i in range(len(texts))],
+                          dtype=np.float32)
+
+    except Exception as e:
+        print(f"  Batch Mode failed ({e}); falling back to sync embedding")
+        return None
+    finally:
+        try:
+            os.unlink(jsonl_path)
+        except OSError:
+            pass
+
+
+def embed_texts(texts: list[str], batch_size: int = 100,
+                max_workers: int = 8,
+                cache: Optional[EmbeddingCache] = None) -> np.ndarray:
+    """Embed texts using Gemini REST API directly (avoids deprecated SDK issues).
+
+    Batches are embedded concurrently on a small thread pool — the work is
+    pure blocking HTTP, so overlapping round-trips cuts wall time to about
+    total_batches / max_workers. Results slot back in by batch index, so
+    output order always matches input order. With a cache, only cache
+    misses are sent to the API.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # Surveys repeat boilerplate answers ("more parking", "n/a"); embed
+    # each distinct text once and re-expand via the inverse index
+    unique_texts, inverse = np.unique(np.asarray(texts, dtype=object),
+                                      return_inverse=True)
+    if len(unique_texts) < len(texts):
+        print(f"  Deduped {len(texts)} -> {len(unique_texts)} unique")
+        emb = embed_texts(unique_texts.tolist(), batch_size, max_workers, cache)
+        return emb[inverse]
+
+    if cache is not None:
+        keys = [cache.key_for(t) for t in texts]
+        hits = cache.get(keys)
+        miss_idx = [i for i, k in enumerate(keys) if k not in hits]
+        print(f"  Embedding cache: {len(texts) - len(miss_idx)} hits, "
+              f"{len(miss_idx)} misses")
+        if not miss_idx:
+            return np.asarray([hits[k] for k in keys], dtype=np.float32)
+
+        miss_vecs = embed_texts([texts[i] for i in miss_idx],
+                                batch_size, max_workers)
+        # Don't cache the all-zero failure fallbacks
+        cache.put({keys[i]: v for i, v in zip(miss_idx, miss_vecs)
+                   if np.any(v)})
+
+        out = np.zeros((len(texts), miss_vecs.shape[1]), dtype=np.float32)
+        for i, k in enumerate(keys):
+            if k in hits:
+                out[i] = hits[k]
+        out[miss_idx] = miss_vecs
+        return out
+
+    print(f"Embedding {len(texts)} texts in batches of {batch_size} "
+          f"({max_workers} in flight)...")
     api_key = GEMINI_API_KEY
     embed_model = "gemini-embedding-001"
-    
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        print(f"  Batch {batch_num}/{total_batches} ({len(batch)} texts)")
-        
-        # Use batchEmbedContents REST endpoint
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{embed_model}:batchEmbedContents?key={api_key}"
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{embed_model}:batchEmbedContents?key={api_key}"
+    single_url = f"https://generativelanguage.googleapis.com/v1beta/models/{embed_model}:embedContent?key={api_key}"
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    # One preallocated output matrix; each finished batch writes its rows
+    # straight in rather than accumulating Python lists
+    out = np.empty((len(texts), EMB_DIM), dtype=np.float32)
+
+    def embed_one_text(text: str) -> list[float]:
+        """Individual-embed fallback for a text in a failed batch."""
+        try:
+            single_payload = {
+                "model": f"models/{embed_model}",
+                "content": {"parts": [{"text": text}]},
+                "taskType": "CLUSTERING",
+                "outputDimensionality": EMB_DIM
+            }
+            _pace_request()
+            r = SESSION.post(single_url, json=single_payload, timeout=30)
+            if r.status_code == 200:
+                return r.json()["embedding"]["values"]
+        except Exception:
+            pass
+        return [0.0] * EMB_DIM
+
+    def embed_batch(batch_num: int, batch: list[str]) -> list[list[float]]:
         payload = {
             "requests": [
                 {
                     "model": f"models/{embed_model}",
                     "content": {"parts": [{"text": text}]},
-                    "taskType": "CLUSTERING"
+                    "taskType": "CLUSTERING",
+                    "outputDimensionality": EMB_DIM
                 }
                 for text in batch
             ]
         }
-        
-        # Retry logic for each batch
-        for attempt in range(3):
-            try:
-                resp = req.post(url, json=payload, timeout=60)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    for emb in data["embeddings"]:
-                        embeddings.append(emb["values"])
-                    break
-                elif resp.status_code == 429:
-                    delay = 2 ** (attempt + 1)
-                    print(f"    Rate limited, waiting {delay}s (attempt {attempt + 1}/3)...")
-                    time.sleep(delay)
-                else:
-                    raise Exception(f"{resp.status_code}: {resp.text[:200]}")
-            except Exception as e:
-                if attempt < 2 and '429' in str(e):
-                    delay = 2 ** (attempt + 1)
-                    print(f"    Rate limited, waiting {delay}s (attempt {attempt + 1}/3)...")
-                    time.sleep(delay)
-                else:
-                    print(f"    Warning: Batch {batch_num} failed: {e}")
-                    # Fall back to individual embedding for this batch
-                    single_url = f"https://generativelanguage.googleapis.com/v1beta/models/{embed_model}:embedContent?key={api_key}"
-                    for text in batch:
-                        try:
-                            single_payload = {
-                                "model": f"models/{embed_model}",
-                                "content": {"parts": [{"text": text}]},
-                                "taskType": "CLUSTERING"
-                            }
-                            r = req.post(single_url, json=single_payload, timeout=30)
-                            if r.status_code == 200:
-                                embeddings.append(r.json()["embedding"]["values"])
-                            else:
-                                embeddings.append([0.0] * 768)
-                        except Exception:
-                            embeddings.append([0.0] * 768)
-                        time.sleep(0.05)
-                    break
-        
-        # Small delay between batches to stay within rate limits
-        time.sleep(0.1)
-    
-    return np.array(embeddings)
+
+        # The session retries 429/5xx with backoff; anything that still
+        # fails drops to individual embedding for the batch
+        try:
+            _pace_request()
+            resp = SESSION.post(url, json=payload, timeout=60)
+            if resp.status_code == 200:
+                return [emb["values"] for emb in resp.json()["embeddings"]]
+            raise Exception(f"{resp.status_code}: {resp.text[:200]}")
+        except Exception as e:
+            print(f"    Warning: Batch {batch_num} failed: {e}")
+            # Fall back to individual embedding for this batch
+            return [embed_one_text(text) for text in batch]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(embed_batch, i + 1, b): i
+                   for i, b in enumerate(batches)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            start = i * batch_size
+            out[start:start + len(batches[i])] = np.asarray(
+                future.result(), dtype=np.float32)
+            print(f"  Batch {done}/{len(batches)} ({len(batches[i])} texts)")
+
+    return out
+
+
+SILHOUETTE_CACHE_PATH = script_dir / 'artifacts' / '.silhouette_cache.json'
+
+
+def _score_k(embeddings: np.ndarray, k: int) -> tuple[int, float]:
+    """Fit one candidate k and return its (subsampled) silhouette score."""
+    mbk = MiniBatchKMeans(n_clusters=k, batch_size=1024, n_init=3,
+                          random_state=42)
+    labels = mbk.fit_predict(embeddings)
+    score = silhouette_score(embeddings, labels, metric='euclidean',
+                             sample_size=min(3000, len(embeddings)),
+                             random_state=42)
+    return k, score
 
 
 def find_optimal_clusters(embeddings: np.ndarray, min_k: int = 4, max_k: int = 10) -> int:
-    """Find optimal cluster count using silhouette score."""
+    """Find optimal cluster count using silhouette score.
+
+    The candidate ks are scored in parallel batches, each with
+    MiniBatchKMeans (cheap fits) and a subsampled silhouette so the sweep
+    stays O(sample^2) instead of O(N^2) per k. Scores are cached per
+    (embedding-hash, k), so repeated runs on identical data skip the
+    sweep entirely; a clear elbow (scores falling well below the best)
+    stops the sweep early.
+    """
     print("Finding optimal cluster count...")
-    best_k = min_k
-    best_score = -1
-    
-    for k in range(min_k, max_k + 1):
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        labels = kmeans.fit_predict(embeddings)
-        score = silhouette_score(embeddings, labels)
-        print(f"  k={k}: silhouette={score:.3f}")
-        
-        if score > best_score:
-            best_score = score
-            best_k = k
-    
+
+    # Small inputs: silhouette is noisy there anyway, so pick the elbow
+    # of the inertia curve instead — cheap fits, no O(sample^2) scoring
+    if len(embeddings) < 100 * max_k:
+        print(f"  Only {len(embeddings)} texts: using inertia elbow instead of silhouette")
+        ks = [k for k in range(min_k, max_k + 1) if k < len(embeddings)]
+        if len(ks) < 3:
+            return ks[0] if ks else min_k
+        inertias = []
+        for k in ks:
+            mbk = MiniBatchKMeans(n_clusters=k, batch_size=1024, n_init=3,
+                                  random_state=42)
+            mbk.fit(embeddings)
+            inertias.append(mbk.inertia_)
+        # Sharpest bend = largest second difference of the inertia curve
+        best_k = ks[int(np.argmax(np.diff(inertias, 2))) + 1]
+        print(f"  Elbow at k={best_k}")
+        return best_k
+
+    emb_key = hashlib.sha256(
+        np.ascontiguousarray(embeddings).tobytes()).hexdigest()[:16]
+    try:
+        score_cache = json.loads(SILHOUETTE_CACHE_PATH.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        score_cache = {}
+
+    ks = list(range(min_k, max_k + 1))
+    cache_dirty = False
+    best_k, best_score = min_k, -1.0
+
+    # Score in batches of 4 so the elbow check can cut the sweep short
+    # without serializing the fits
+    for pos in range(0, len(ks), 4):
+        batch = ks[pos:pos + 4]
+        missing = [k for k in batch if f"{emb_key}:{k}" not in score_cache]
+        if missing:
+            for k, score in Parallel(n_jobs=-1)(
+                    delayed(_score_k)(embeddings, k) for k in missing):
+                score_cache[f"{emb_key}:{k}"] = score
+                cache_dirty = True
+
+        stop = False
+        for k in batch:
+            score = score_cache[f"{emb_key}:{k}"]
+            print(f"  k={k}: silhouette={score:.3f}")
+            if score > best_score:
+                best_score = score
+                best_k = k
+            elif score < best_score - 0.02 and k > best_k + 1:
+                stop = True
+                break
+        if stop:
+            print("  Scores declining; stopping sweep early")
+            break
+
+    if cache_dirty:
+        try:
+            SILHOUETTE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            SILHOUETTE_CACHE_PATH.write_text(json.dumps(score_cache),
+                                             encoding='utf-8')
+        except OSError:
+            pass
+
     print(f"  Optimal k={best_k} (silhouette={best_score:.3f})")
     return best_k
 
 
-def cluster_texts(embeddings: np.ndarray, n_clusters: int) -> tuple[np.ndarray, KMeans]:
-    """Cluster embeddings with K-Means."""
+class _FaissKMeans:
+    """Minimal stand-in exposing the two attributes build_themes reads."""
+
+    def __init__(self, centroids: np.ndarray):
+        self.cluster_centers_ = centroids
+        self.n_clusters = len(centroids)
+
+
+def cluster_texts(embeddings: np.ndarray, n_clusters: int):
+    """Cluster embeddings with K-Means.
+
+    Uses faiss's SIMD/OpenMP kernel when the optional dependency is
+    installed — roughly an order of magnitude faster than sklearn at this
+    shape — otherwise falls back to sklearn KMeans. Returns (labels,
+    kmeans-like) where the second value exposes cluster_centers_ and
+    n_clusters.
+    """
     print(f"Clustering into {n_clusters} themes...")
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+
+    try:
+        import faiss
+    except ImportError:
+        faiss = None
+
+    if faiss is not None:
+        x = np.ascontiguousarray(embeddings, dtype=np.float32)
+        km = faiss.Kmeans(d=x.shape[1], k=n_clusters, niter=20, nredo=3,
+                          seed=42, verbose=False)
+        km.train(x)
+        _, labels = km.index.search(x, 1)
+        return labels.ravel(), _FaissKMeans(km.centroids)
+
+    if len(embeddings) > 5000:
+        # Mini-batch iterations touch 1k rows instead of N; centroids are
+        # indistinguishable at this scale for a fraction of the wall time
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42,
+                                 batch_size=1024, n_init=3, max_iter=100)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
     labels = kmeans.fit_predict(embeddings)
     return labels, kmeans
 
@@ -225,7 +568,8 @@ Reply with ONLY the label, nothing else. Examples: "Cost Concerns", "Need More S
             error_msg = str(e).lower()
             if 'rate' in error_msg or 'quota' in error_msg or '429' in error_msg:
                 # Rate limit - wait and retry with exponential backoff
-                delay = base_delay * (2 ** attempt)
+                # Full jitter keeps parallel retries from re-colliding
+                delay = random.uniform(0, min(30, base_delay * (2 ** attempt)))
                 print(f"    Rate limited, waiting {delay}s before retry {attempt + 1}/{max_retries}...")
                 time.sleep(delay)
             else:
@@ -290,9 +634,31 @@ def generate_fallback_label(texts: list[str], used_labels: set = None) -> str:
     return f"Theme {len(used_labels) + 1}"
 
 
+LABEL_CACHE_PATH = script_dir / 'artifacts' / '.label_cache.json'
+
+
+def _label_cache_key(cluster_data: list[dict], model_name: str) -> str:
+    """Cache key over the exact samples the labelling prompt would see."""
+    sample = "\x00".join("\n".join(sorted(c['texts'][:3])) for c in cluster_data)
+    return hashlib.sha256((model_name + "\x00" + sample).encode('utf-8')).hexdigest()
+
+
 def generate_all_labels(cluster_data: list[dict], model_name: str = "gemini-2.0-flash-001") -> list[str]:
-    """Generate ALL cluster labels in one API call to ensure uniqueness."""
-    
+    """Generate ALL cluster labels in one API call to ensure uniqueness.
+
+    Results are cached on disk keyed by the sampled texts, so re-runs on
+    unchanged clusters (e.g. while tuning --quotes) skip the LLM call.
+    """
+    cache_key = _label_cache_key(cluster_data, model_name)
+    try:
+        label_cache = json.loads(LABEL_CACHE_PATH.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        label_cache = {}
+    cached = label_cache.get(cache_key)
+    if cached and len(cached) == len(cluster_data):
+        print("    Labels served from cache")
+        return cached
+
     # Build prompt with samples from each cluster
     cluster_sections = []
     for i, cluster in enumerate(cluster_data):
@@ -331,13 +697,20 @@ Bus Route Issues
             labels = []
             for line in lines:
                 # Remove numbering like "1." or "1:"
-                import re
-                cleaned = re.sub(r'^\d+[\.\):\s]+', '', line).strip().strip('"\'')
+                cleaned = _NUM_PREFIX_RE.sub('', line).strip().strip('"\'')
                 if cleaned:
                     labels.append(cleaned[:50])
             
             if len(labels) >= len(cluster_data):
-                return labels[:len(cluster_data)]
+                labels = labels[:len(cluster_data)]
+                label_cache[cache_key] = labels
+                try:
+                    LABEL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                    LABEL_CACHE_PATH.write_text(json.dumps(label_cache),
+                                                encoding='utf-8')
+                except OSError:
+                    pass
+                return labels
             else:
                 print(f"    Warning: Got {len(labels)} labels, expected {len(cluster_data)}")
                 # Pad with fallback labels, tracking used ones
@@ -351,7 +724,8 @@ Bus Route Issues
         except Exception as e:
             error_msg = str(e).lower()
             if 'rate' in error_msg or 'quota' in error_msg or '429' in error_msg:
-                delay = base_delay * (2 ** attempt)
+                # Full jitter keeps parallel retries from re-colliding
+                delay = random.uniform(0, min(30, base_delay * (2 ** attempt)))
                 print(f"    Rate limited, waiting {delay}s before retry {attempt + 1}/{max_retries}...")
                 time.sleep(delay)
             else:
@@ -369,121 +743,246 @@ Bus Route Issues
     return labels
 
 
-def get_representative_quotes(
+def get_candidate_quotes(
     texts: list[str],
     embeddings: np.ndarray,
     centroid: np.ndarray,
-    n_quotes: int = 5,
-    theme_label: str = ""
+    n_candidates: int = 20
 ) -> list[str]:
-    """Get representative quotes using LLM curation.
-    
-    1. Takes top 20 candidates by centroid distance
-    2. Asks Gemini to pick the best n_quotes that represent the theme
-    3. Falls back to pure centroid if LLM fails
+    """Top candidate quotes by centroid similarity, nearest first.
+
+    Embeddings are unit-normalized upstream, so centroid distance
+    reduces to a negated dot product — one gemv, no (N, 768) temporary —
+    and argpartition keeps the top-k selection O(N).
     """
-    import requests as req
-    
-    # Step 1: Get candidate pool (top 20 nearest centroid)
-    n_candidates = min(20, len(texts))
-    distances = np.linalg.norm(embeddings - centroid, axis=1)
-    closest_indices = np.argsort(distances)[:n_candidates]
-    candidates = [texts[i] for i in closest_indices]
-    
-    # If we have fewer candidates than needed, return all
-    if len(candidates) <= n_quotes:
-        return candidates
-    
-    # Step 2: Ask Gemini to pick the best quotes
-    if not theme_label or not GEMINI_API_KEY:
-        return candidates[:n_quotes]
-    
-    numbered = "\n".join(f"{i+1}. \"{q}\"" for i, q in enumerate(candidates))
-    prompt = f"""You are curating representative quotes for a survey theme.
+    n_candidates = min(n_candidates, len(texts))
+    centroid = centroid.astype(embeddings.dtype, copy=False)
+    d2 = -(embeddings @ centroid)
+    if n_candidates < len(d2):
+        idx = np.argpartition(d2, n_candidates)[:n_candidates]
+    else:
+        idx = np.arange(len(d2))
+    closest_indices = idx[np.argsort(d2[idx])]
+    return [texts[i] for i in closest_indices]
+
+
+def curate_all_quotes(candidates_per_cluster: list[list[str]],
+                      theme_labels: list[str],
+                      n_quotes: int = 5) -> list[list[str]]:
+    """Pick the best quotes for every theme in a single Gemini call.
+
+    One prompt covers all clusters (mirroring generate_all_labels), so
+    quote curation costs one RPC instead of one per cluster. Any cluster
+    whose picks can't be parsed falls back to its centroid-nearest
+    candidates.
+    """
+    fallback = [cands[:n_quotes] for cands in candidates_per_cluster]
+    if not GEMINI_API_KEY:
+        return fallback
+
+    # Clusters small enough to take everything don't need curation
+    needs_curation = [i for i, cands in enumerate(candidates_per_cluster)
+                      if len(cands) > n_quotes]
+    if not needs_curation:
+        return fallback
 
-Theme: "{theme_label}"
+    sections = []
+    for i in needs_curation:
+        numbered = "\n".join(f'  {j+1}. "{q[:150]}"' for j, q
+                             in enumerate(candidates_per_cluster[i]))
+        sections.append(f'CLUSTER {i+1} (theme: "{theme_labels[i]}"):\n{numbered}')
 
-Here are {len(candidates)} candidate quotes from this theme cluster. Pick the {n_quotes} that BEST represent this theme — they should clearly and directly relate to "{theme_label}".
+    prompt = f"""You are curating representative quotes for survey themes.
 
-Candidates:
-{numbered}
+For EACH cluster below, pick the {n_quotes} candidate quotes that BEST represent its theme — they should clearly and directly relate to the theme label.
 
-Reply with ONLY the numbers of your top {n_quotes} picks, separated by commas. Example: 1,5,8,12,3"""
+{chr(10).join(sections)}
+
+Reply with one line per cluster, formatted as "<cluster number>: <comma-separated quote numbers>". Example:
+1: 2,5,8,12,3
+2: 1,4,6,9,10"""
 
     try:
         url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
         payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        resp = req.post(url, json=payload, timeout=30)
-        
+        resp = SESSION.post(url, json=payload, timeout=60)
+
         if resp.status_code == 200:
-            text = resp.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-            # Parse comma-separated numbers
-            nums = [int(x.strip()) for x in text.replace('\n', ',').split(',') if x.strip().isdigit()]
-            # Convert 1-indexed to 0-indexed, filter valid
-            selected = [candidates[n-1] for n in nums if 1 <= n <= len(candidates)]
-            if len(selected) >= n_quotes:
-                return selected[:n_quotes]
+            text = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+            picks = {}
+            for line in text.strip().split('\n'):
+                if ':' not in line:
+                    continue
+                head, _, tail = line.partition(':')
+                head = head.strip().lstrip('CLUSTERcluster ').strip()
+                if not head.isdigit():
+                    continue
+                i = int(head) - 1
+                if i not in needs_curation:
+                    continue
+                cands = candidates_per_cluster[i]
+                nums = [int(x.strip()) for x in tail.split(',')
+                        if x.strip().isdigit()]
+                selected = [cands[n-1] for n in nums if 1 <= n <= len(cands)]
+                if len(selected) >= n_quotes:
+                    picks[i] = selected[:n_quotes]
+            return [picks.get(i, fallback[i])
+                    for i in range(len(candidates_per_cluster))]
     except Exception as e:
         print(f"    LLM quote curation failed: {e}, using centroid fallback")
-    
-    # Fallback: return centroid-nearest
-    return candidates[:n_quotes]
+
+    return fallback
+
+
+def label_and_curate(cluster_data: list[dict],
+                     candidates_per_cluster: list[list[str]],
+                     n_quotes: int = 5) -> Optional[tuple[list[str], list[list[str]]]]:
+    """Label every cluster AND pick its quotes in one Gemini call.
+
+    Folds generate_all_labels and curate_all_quotes into a single prompt
+    that returns a JSON array of {label, picks}. Returns (labels,
+    quotes_per_cluster), or None when the call or parse fails so the
+    caller can fall back to the two-call path.
+    """
+    if not GEMINI_API_KEY:
+        return None
+
+    sections = []
+    for i, (cluster, cands) in enumerate(zip(cluster_data,
+                                             candidates_per_cluster)):
+        numbered = "\n".join(f'  {j+1}. "{q[:150]}"'
+                             for j, q in enumerate(cands))
+        sections.append(f"CLUSTER {i+1} ({cluster['count']} comments):\n{numbered}")
+
+    prompt = f"""Below are {len(cluster_data)} clusters of student comments about university parking.
+
+For EACH cluster:
+1. Generate a SHORT, UNIQUE label (2-4 words) capturing its main theme — every label must differ from the others.
+2. Pick the {n_quotes} quotes (by number) that BEST represent that theme.
+
+{chr(10).join(sections)}
+
+Reply with ONLY a JSON array, one object per cluster in order:
+[{{"label": "Need More Spots", "picks": [2, 5, 8, 12, 3]}}, ...]"""
+
+    try:
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        resp = SESSION.post(url, json=payload, timeout=60)
+        if resp.status_code != 200:
+            return None
+
+        text = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+        match = re.search(r'\[.*\]', text, re.DOTALL)
+        if not match:
+            return None
+        parsed = json.loads(match.group(0))
+        if len(parsed) != len(cluster_data):
+            return None
+
+        labels, quotes = [], []
+        for i, entry in enumerate(parsed):
+            label = str(entry.get('label', '')).strip().strip('"\'')[:50]
+            if not label:
+                return None
+            cands = candidates_per_cluster[i]
+            picks = [cands[n - 1] for n in entry.get('picks', [])
+                     if isinstance(n, int) and 1 <= n <= len(cands)]
+            if len(picks) < min(n_quotes, len(cands)):
+                picks = cands[:n_quotes]
+            labels.append(label)
+            quotes.append(picks[:n_quotes])
+
+        if len(set(labels)) != len(labels):
+            return None
+        return labels, quotes
+
+    except Exception as e:
+        print(f"    Combined label+curation call failed: {e}")
+        return None
 
 
 def build_themes(
     df: pd.DataFrame,
     embeddings: np.ndarray,
     labels: np.ndarray,
-    kmeans: KMeans,
+    kmeans,
     n_quotes: int = 5
 ) -> list[dict]:
     """Build theme objects with labels and quotes."""
     print("Building theme objects...")
-    
+
+    # k never exceeds a few dozen; int8 keeps the label array tiny
+    labels = labels.astype(np.int8, copy=False)
+
+    # One stable sort of labels gives contiguous per-cluster index blocks —
+    # no N-boolean mask and full-array scan per cluster
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    cluster_ids = np.arange(kmeans.n_clusters)
+    starts = np.searchsorted(sorted_labels, cluster_ids)
+    ends = np.searchsorted(sorted_labels, cluster_ids, side='right')
+
     # First, collect all cluster data
     cluster_data = []
     for cluster_id in range(kmeans.n_clusters):
-        mask = labels == cluster_id
-        cluster_texts = df[mask]['text'].tolist()
-        cluster_embeddings = embeddings[mask]
-        cluster_df = df[mask]
-        
-        if len(cluster_texts) == 0:
+        idx = order[starts[cluster_id]:ends[cluster_id]]
+
+        if len(idx) == 0:
             continue
-            
+
         cluster_data.append({
             'id': cluster_id,
-            'texts': cluster_texts,
-            'embeddings': cluster_embeddings,
-            'df': cluster_df,
-            'count': len(cluster_texts),
+            'texts': df['text'].iloc[idx].tolist(),
+            'embeddings': embeddings[idx],
+            'count': len(idx),
         })
-    
-    # Generate ALL labels in one API call to ensure uniqueness
-    print(f"  Generating {len(cluster_data)} unique labels...")
-    all_labels = generate_all_labels(cluster_data)
-    
+
+    # Segment rollups in one grouped pass over df instead of per-cluster
+    # value_counts on boolean-masked slices
+    arrival_counts = df.groupby(labels)['arrival_time'].value_counts().unstack(fill_value=0)
+    mode_counts = df.groupby(labels)['mode'].value_counts().unstack(fill_value=0)
+    skip_rates = df.groupby(labels)['skipped_class'].mean() \
+        if 'skipped_class' in df.columns else None
+
+    def _counts_for(table: pd.DataFrame, cluster_id: int) -> dict:
+        row = table.loc[cluster_id]
+        row = row[row > 0].sort_values(ascending=False)
+        return {k: int(v) for k, v in row.items()}
+
+    # Candidate quotes per cluster, then one LLM call both labels the
+    # clusters and curates the quotes; two-call path as fallback
+    candidates_per_cluster = [
+        get_candidate_quotes(
+            cluster['texts'],
+            cluster['embeddings'],
+            kmeans.cluster_centers_[cluster['id']])
+        for cluster in cluster_data
+    ]
+
+    print(f"  Labeling and curating {len(cluster_data)} clusters...")
+    combined = label_and_curate(cluster_data, candidates_per_cluster, n_quotes)
+    if combined is not None:
+        all_labels, all_quotes = combined
+    else:
+        all_labels = generate_all_labels(cluster_data)
+        all_quotes = curate_all_quotes(candidates_per_cluster, all_labels,
+                                       n_quotes)
+
     themes = []
     for i, cluster in enumerate(cluster_data):
         print(f"  Cluster {cluster['id']}: {cluster['count']} texts")
-        
+
         label = all_labels[i] if i < len(all_labels) else f"Theme {i+1}"
         print(f"    Label: {label}")
-        
-        # Get representative quotes (LLM-curated)
-        quotes = get_representative_quotes(
-            cluster['texts'],
-            cluster['embeddings'],
-            kmeans.cluster_centers_[cluster['id']],
-            n_quotes,
-            theme_label=label
-        )
-        
-        # Calculate segment breakdown
+
+        quotes = all_quotes[i]
+
+        # Calculate segment breakdown (precomputed grouped views)
         segments = {
-            'by_arrival_time': cluster['df']['arrival_time'].value_counts().to_dict(),
-            'by_mode': cluster['df']['mode'].value_counts().to_dict(),
-            'skip_rate': cluster['df']['skipped_class'].mean() if 'skipped_class' in cluster['df'] else None,
+            'by_arrival_time': _counts_for(arrival_counts, cluster['id']),
+            'by_mode': _counts_for(mode_counts, cluster['id']),
+            'skip_rate': skip_rates.loc[cluster['id']] if skip_rates is not None else None,
         }
         themes.append({
             'id': cluster['id'],
@@ -506,6 +1005,12 @@ def main():
     parser.add_argument('--output', '-o', required=True, help='Path to output themes.json')
     parser.add_argument('--clusters', '-k', type=int, default=0, help='Number of clusters (0=auto)')
     parser.add_argument('--quotes', '-q', type=int, default=5, help='Quotes per cluster')
+    parser.add_argument('--batch', action='store_true',
+                        help='Embed via the Batch Mode API (50%% cost, slower turnaround)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Concurrent embedding batches for the sync path')
+    parser.add_argument('--cache-dir', default='artifacts',
+                        help='Directory for the persistent embedding cache')
     args = parser.parse_args()
     
     input_path = Path(args.input)
@@ -522,17 +1027,48 @@ def main():
         print("Error: Not enough text responses for clustering")
         sys.exit(1)
     
-    # Embed
-    embeddings = embed_texts(df['text'].tolist())
-    
-    # Determine cluster count
-    n_clusters = args.clusters
-    if n_clusters == 0:
-        n_clusters = find_optimal_clusters(embeddings)
-    
-    # Cluster
-    labels, kmeans = cluster_texts(embeddings, n_clusters)
-    
+    # Fast path: reuse (embeddings, labels, centroids) from a previous run
+    # on identical input and -k, so iterating on labeling/output skips the
+    # API and clustering entirely.
+    csv_hash = hashlib.sha256(input_path.read_bytes()).hexdigest()[:16]
+    cluster_cache = (Path(args.cache_dir)
+                     / f'.cluster_cache_{csv_hash}_k{args.clusters}.npz')
+    if cluster_cache.exists():
+        print(f"Reusing cached clustering from {cluster_cache}")
+        cached = np.load(cluster_cache)
+        embeddings = cached['embeddings']
+        labels = cached['labels']
+        kmeans = _FaissKMeans(cached['centers'])
+        n_clusters = kmeans.n_clusters
+    else:
+        # Embed (Batch Mode when requested, sync REST otherwise)
+        embeddings = None
+        if args.batch:
+            embeddings = embed_texts_batch_mode(df['text'].tolist())
+        if embeddings is None:
+            cache = EmbeddingCache(Path(args.cache_dir) / '.emb_cache.sqlite',
+                                   model="gemini-embedding-001")
+            embeddings = embed_texts(df['text'].tolist(),
+                                     max_workers=args.concurrency, cache=cache)
+
+        # Unit-normalize once: clustering then works in angular space and
+        # centroid distance downstream reduces to a dot product
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings /= norms
+
+        # Determine cluster count
+        n_clusters = args.clusters
+        if n_clusters == 0:
+            n_clusters = find_optimal_clusters(embeddings)
+
+        # Cluster
+        labels, kmeans = cluster_texts(embeddings, n_clusters)
+
+        cluster_cache.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(cluster_cache, embeddings=embeddings,
+                            labels=labels, centers=kmeans.cluster_centers_)
+
     # Build themes
     themes = build_themes(df, embeddings, labels, kmeans, args.quotes)
     
@@ -548,8 +1084,12 @@ def main():
     }
     
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, default=str)
+    # orjson serializes numpy scalars natively and skips the slow
+    # stdlib pretty-printer
+    output_path.write_bytes(orjson.dumps(
+        output, option=(orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NON_STR_KEYS),
+        default=str))
     
     print(f"\n✅ Saved themes to {output_path}")
     print(f"\n📊 Theme Summary:")
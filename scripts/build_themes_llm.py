@@ -14,35 +14,28 @@ Output matches the same themes.json format used by the dashboard.
 import argparse
 import json
 import os
+import random
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+import orjson
 import pandas as pd
 
 # Fix Windows terminal encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
-# Load .env.local
+# Load .env.local via the shared loader
+from _env import load_env
+
 script_dir = Path(__file__).parent.parent
-env_file = script_dir / '.env.local'
-if env_file.exists():
-    try:
-        content = env_file.read_text(encoding='utf-8-sig')
-    except UnicodeDecodeError:
-        content = env_file.read_text(encoding='utf-16')
-    for line in content.strip().split('\n'):
-        line = line.strip()
-        if line and '=' in line and not line.startswith('#'):
-            key, value = line.split('=', 1)
-            os.environ[key.strip()] = value.strip()
+load_env()
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    print("Error: GEMINI_API_KEY not set in environment")
-    sys.exit(1)
 
 import requests
 
@@ -52,26 +45,51 @@ import requests
 def load_text_data(csv_path: Path) -> pd.DataFrame:
     """Load survey texts from clean CSV."""
     print(f"Loading {csv_path}...")
-    df = pd.read_csv(csv_path)
+
+    # Only 6 of the survey's columns are used downstream; restricting
+    # usecols skips parsing the rest, and category dtypes collapse the
+    # repeated segment strings to int codes.
+    needed = ['id', 'suggestion', 'skip_experience', 'arrival_time', 'mode',
+              'skipped_class']
+    header = pd.read_csv(csv_path, nrows=0)
+    usecols = [c for c in needed if c in header.columns]
+    dtypes = {c: 'string' for c in ('suggestion', 'skip_experience') if c in usecols}
+    dtypes.update({c: 'category' for c in ('arrival_time', 'mode') if c in usecols})
+    try:
+        # Multi-threaded SIMD tokenizer; falls back to the default C
+        # engine if the pyarrow wheel isn't installed
+        df = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, engine='pyarrow')
+    except (ImportError, ValueError):
+        df = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
 
     # Get text from suggestion or skip_experience columns
     suggestion = df.get('suggestion', pd.Series(dtype=str)).fillna('').astype(str)
     experience = df.get('skip_experience', pd.Series(dtype=str)).fillna('').astype(str)
 
-    # Prefer suggestion if long enough, else use experience
-    use_suggestion = suggestion.str.len() > 15
+    # Prefer suggestion if long enough, else use experience. Lengths are
+    # computed once per column and combined, instead of a third scan
+    # over the merged text.
+    slen = suggestion.str.len().to_numpy()
+    elen = experience.str.len().to_numpy()
+    use_suggestion = pd.Series(slen > 15, index=df.index)
     text = suggestion.where(use_suggestion, experience)
 
-    # Only keep substantive responses
-    mask = text.str.len() > 15
+    # Filter to substantive responses BEFORE assembling the frame, so
+    # the dropped rows are never materialized
+    keep = np.flatnonzero(np.where(slen > 15, slen, elen) > 15)
+
+    def take(col: str, fill) -> pd.Series:
+        if col in df.columns:
+            return df[col].iloc[keep].reset_index(drop=True)
+        return pd.Series([fill] * len(keep))
 
     result = pd.DataFrame({
-        'id': df.get('id', pd.Series(range(len(df)))),
-        'text': text,
-        'arrival_time': df.get('arrival_time', pd.Series(dtype=str)),
-        'mode': df.get('mode', pd.Series(dtype=str)),
-        'skipped_class': df.get('skipped_class', pd.Series(dtype=bool)).fillna(False),
-    })[mask].reset_index(drop=True)
+        'id': take('id', None) if 'id' in df.columns else pd.Series(keep),
+        'text': text.iloc[keep].reset_index(drop=True),
+        'arrival_time': take('arrival_time', ''),
+        'mode': take('mode', ''),
+        'skipped_class': take('skipped_class', False).fillna(False),
+    }, copy=False)
 
     print(f"  Found {len(result)} substantive text responses")
     return result
@@ -97,8 +115,9 @@ def call_gemini(prompt: str, model: str = "gemini-2.5-pro") -> str:
                 data = resp.json()
                 return data["candidates"][0]["content"]["parts"][0]["text"]
             elif resp.status_code == 429:
-                delay = 2 ** (attempt + 1)
-                print(f"  Rate limited, waiting {delay}s...")
+                # Full jitter keeps parallel retries from re-colliding
+                delay = random.uniform(0, min(30, 2 ** (attempt + 1)))
+                print(f"  Rate limited, waiting {delay:.1f}s...")
                 time.sleep(delay)
             else:
                 print(f"  API error {resp.status_code}: {resp.text[:300]}")
@@ -130,6 +149,7 @@ IMPORTANT RULES:
 - For each theme, count how many comments relate to it (a comment can count in multiple themes)
 - For each theme, pick the 5 most representative VERBATIM quotes — they must be EXACT text from the list below
 - Also provide a 1-2 sentence insight/summary for each theme
+- Assign every comment its PRIMARY theme: "assignments" must have exactly {len(texts)} entries, where entry i is the 1-based position (in your themes list) of the best theme for comment i
 
 Respond with this JSON schema:
 {{
@@ -141,6 +161,7 @@ Respond with this JSON schema:
       "quotes": ["exact quote 1", "exact quote 2", "exact quote 3", "exact quote 4", "exact quote 5"]
     }}
   ],
+  "assignments": [1, 1, 3, 2, ...],
   "total_analyzed": {len(texts)}
 }}
 
@@ -178,22 +199,29 @@ STUDENT RESPONSES:
 
 # ── Step 3: Tag comments for segment breakdown ──────────────────────────
 
-def tag_comments_batch(texts: list[str], theme_labels: list[str], batch_size: int = 200) -> list[str]:
-    """Tag each comment with its PRIMARY theme using Gemini Flash (fast+cheap)."""
-    print(f"\n  Tagging {len(texts)} comments with primary theme (for segment breakdowns)...")
+def assignments_to_tags(assignments, theme_labels: list[str], n_texts: int) -> list[str] | None:
+    """Map the analysis call's per-comment assignments to theme labels.
 
-    labels_str = "\n".join(f"  {i+1}. {label}" for i, label in enumerate(theme_labels))
-    all_tags = []
+    Returns None when assignments are missing or the wrong length, in
+    which case the caller falls back to the batched tagging pass.
+    """
+    if not assignments or len(assignments) != n_texts:
+        return None
+    tags = []
+    for num in assignments:
+        try:
+            idx = int(num) - 1
+        except (TypeError, ValueError):
+            idx = 0
+        tags.append(theme_labels[idx] if 0 <= idx < len(theme_labels) else theme_labels[0])
+    return tags
 
-    total_batches = (len(texts) - 1) // batch_size + 1
-    for batch_idx in range(0, len(texts), batch_size):
-        batch = texts[batch_idx:batch_idx + batch_size]
-        batch_num = batch_idx // batch_size + 1
-        print(f"  Tagging batch {batch_num}/{total_batches} ({len(batch)} texts)")
 
-        numbered = "\n".join(f"{i+1}. {t.strip()}" for i, t in enumerate(batch))
+def _tag_one_batch(batch: list[str], labels_str: str, n_themes: int) -> list[int]:
+    """Tag a single batch of comments; returns 1-based theme numbers."""
+    numbered = "\n".join(f"{i+1}. {t.strip()}" for i, t in enumerate(batch))
 
-        prompt = f"""For each comment below, reply with ONLY the number of its best-matching theme.
+    prompt = f"""For each comment below, reply with ONLY the number of its best-matching theme.
 
 Themes:
 {labels_str}
@@ -201,41 +229,66 @@ Themes:
 Comments:
 {numbered}
 
-Reply with {len(batch)} lines, each containing ONLY a theme number (1-{len(theme_labels)}). No other text."""
+Reply with {len(batch)} lines, each containing ONLY a theme number (1-{n_themes}). No other text."""
 
-        try:
-            response = call_gemini(prompt, model="gemini-2.5-flash")
-            # Parse structured JSON response
-            try:
-                data = json.loads(response)
-                # Handle various JSON formats the model might return
-                if isinstance(data, list):
-                    nums = data
-                elif isinstance(data, dict) and 'tags' in data:
-                    nums = data['tags']
-                else:
-                    nums = list(data.values()) if isinstance(data, dict) else []
-            except (json.JSONDecodeError, TypeError):
-                # Fallback: parse as newline-separated numbers
-                lines = response.strip().split('\n')
-                nums = []
-                for line in lines:
-                    clean = ''.join(c for c in line if c.isdigit())
-                    if clean:
-                        nums.append(int(clean))
+    response = call_gemini(prompt, model="gemini-2.5-flash")
+    # Parse structured JSON response
+    try:
+        data = json.loads(response)
+        # Handle various JSON formats the model might return
+        if isinstance(data, list):
+            nums = data
+        elif isinstance(data, dict) and 'tags' in data:
+            nums = data['tags']
+        else:
+            nums = list(data.values()) if isinstance(data, dict) else []
+    except (json.JSONDecodeError, TypeError):
+        # Fallback: parse as newline-separated numbers
+        nums = []
+        for line in response.strip().split('\n'):
+            clean = ''.join(c for c in line if c.isdigit())
+            if clean:
+                nums.append(int(clean))
+    return nums
+
+
+def tag_comments_batch(texts: list[str], theme_labels: list[str], batch_size: int = 200,
+                       max_workers: int = 6) -> list[str]:
+    """Tag each comment with its PRIMARY theme using Gemini Flash (fast+cheap).
+
+    Batches run concurrently on a small thread pool; the API handles the
+    pacing (call_gemini retries 429s with jittered backoff), so wall-clock
+    time scales with the slowest batch instead of the sum of all batches.
+    """
+    print(f"\n  Tagging {len(texts)} comments with primary theme (for segment breakdowns)...")
 
+    labels_str = "\n".join(f"  {i+1}. {label}" for i, label in enumerate(theme_labels))
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    tags_per_batch: list[list[str]] = [[] for _ in batches]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        futures = {pool.submit(_tag_one_batch, batch, labels_str, len(theme_labels)): b
+                   for b, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            b = futures[future]
+            batch = batches[b]
+            print(f"  Tagged batch {b+1}/{len(batches)} ({len(batch)} texts)")
+            try:
+                nums = future.result()
+            except Exception as e:
+                print(f"    Batch tagging failed: {e}, using first theme as default")
+                tags_per_batch[b] = [theme_labels[0]] * len(batch)
+                continue
+            batch_tags = []
             for num in nums:
                 idx = int(num) - 1
                 if 0 <= idx < len(theme_labels):
-                    all_tags.append(theme_labels[idx])
+                    batch_tags.append(theme_labels[idx])
                 else:
-                    all_tags.append(theme_labels[0])  # fallback
-        except Exception as e:
-            print(f"    Batch tagging failed: {e}, using first theme as default")
-            all_tags.extend([theme_labels[0]] * len(batch))
-
-        time.sleep(0.2)
+                    batch_tags.append(theme_labels[0])  # fallback
+            tags_per_batch[b] = batch_tags
 
+    all_tags = [tag for batch_tags in tags_per_batch for tag in batch_tags]
     return all_tags[:len(texts)]
 
 
@@ -259,9 +312,17 @@ def build_output(llm_result: dict, df: pd.DataFrame, tags: list[str], input_file
             # Fallback: use all data proportionally
             theme_df = df.sample(min(50, len(df)))
 
+        def _counts(col: str) -> dict:
+            # Drop zero-count buckets so categorical dtypes don't add
+            # empty keys the object-dtype path never produced
+            if col not in theme_df:
+                return {}
+            vc = theme_df[col].value_counts()
+            return vc[vc > 0].to_dict()
+
         segments = {
-            'by_arrival_time': theme_df['arrival_time'].value_counts().to_dict() if 'arrival_time' in theme_df else {},
-            'by_mode': theme_df['mode'].value_counts().to_dict() if 'mode' in theme_df else {},
+            'by_arrival_time': _counts('arrival_time'),
+            'by_mode': _counts('mode'),
             'skip_rate': float(theme_df['skipped_class'].mean()) if 'skipped_class' in theme_df else None,
         }
 
@@ -290,11 +351,15 @@ def build_output(llm_result: dict, df: pd.DataFrame, tags: list[str], input_file
 
 # ── Main ────────────────────────────────────────────────────────────────
 
-def main():
-    parser = argparse.ArgumentParser(description='LLM-powered thematic analysis')
-    parser.add_argument('--input', '-i', required=True, help='Path to clean CSV')
-    parser.add_argument('--output', '-o', required=True, help='Output path for themes.json')
-    args = parser.parse_args()
+def run(args) -> int:
+    """Run the LLM analysis; returns a process-style exit code.
+
+    Callable in-process (e.g. from refresh_data.py) with any namespace
+    exposing .input and .output.
+    """
+    if not GEMINI_API_KEY:
+        print("Error: GEMINI_API_KEY not set in environment")
+        return 1
 
     total_start = time.time()
 
@@ -310,16 +375,24 @@ def main():
     for t in llm_result.get('themes', []):
         print(f"    {t['label']}: {t.get('count', '?')} comments")
 
-    # Phase 2: Tag each comment for segment breakdowns
-    tags = tag_comments_batch(texts, theme_labels)
+    # Phase 2: Tag each comment for segment breakdowns. The Pro call
+    # already returns per-comment assignments, so the separate Flash
+    # tagging pass only runs if the model omitted them.
+    tags = assignments_to_tags(llm_result.get('assignments'), theme_labels, len(texts))
+    if tags is None:
+        tags = tag_comments_batch(texts, theme_labels)
 
     # Phase 3: Build and save output
     output = build_output(llm_result, df, tags, args.input)
 
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w') as f:
-        json.dump(output, f, indent=2, default=str)
+    # orjson serializes numpy scalars natively and skips the slow
+    # stdlib pretty-printer
+    output_path.write_bytes(orjson.dumps(
+        output, option=(orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NON_STR_KEYS),
+        default=str))
 
     total_elapsed = time.time() - total_start
     print(f"\n{'='*50}")
@@ -330,6 +403,14 @@ def main():
     print(f"\n  Theme Summary:")
     for t in output['themes']:
         print(f"    {t['label']}: {t['count']} ({t['pct']}%)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM-powered thematic analysis')
+    parser.add_argument('--input', '-i', required=True, help='Path to clean CSV')
+    parser.add_argument('--output', '-o', required=True, help='Output path for themes.json')
+    sys.exit(run(parser.parse_args()))
 
 
 if __name__ == '__main__':
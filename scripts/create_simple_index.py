@@ -5,45 +5,48 @@ This uses the quotes from themes.json rather than re-embedding everything.
 A simpler approach that doesn't require the embedding API.
 """
 
-import json
 from pathlib import Path
-import hashlib
+
+import orjson
 
 def create_simple_index():
     """Create a simple document index from themes.json quotes."""
     script_dir = Path(__file__).parent.parent
     themes_path = script_dir / 'artifacts' / 'themes.json'
     output_path = script_dir / 'artifacts' / 'simple_index.json'
-    
+
     if not themes_path.exists():
         raise FileNotFoundError(f"themes.json not found at {themes_path}")
-    
-    with open(themes_path, 'r', encoding='utf-8') as f:
-        themes_data = json.load(f)
-    
-    # Extract all quotes from themes
+
+    themes_data = orjson.loads(themes_path.read_bytes())
+
+    # Store each theme once and reference it by position from the
+    # documents, instead of repeating the label/id strings per quote
+    theme_refs = []
     documents = []
-    for theme in themes_data['themes']:
+    for theme_idx, theme in enumerate(themes_data['themes']):
+        theme_refs.append({'id': theme['id'], 'label': theme['label']})
         for i, quote in enumerate(theme['quotes']):
             documents.append({
                 'id': f"{theme['id']}_{i}",
                 'text': quote,
-                'theme_label': theme['label'],
-                'theme_id': theme['id'],
+                'theme_idx': theme_idx,
             })
-    
+
     index = {
         'metadata': {
             'total_documents': len(documents),
             'source': 'themes.json quotes',
         },
+        'themes': theme_refs,
         'documents': documents
     }
-    
+
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(index, f, indent=2)
-    
+    # orjson emits compact bytes by default: the index is machine-read,
+    # indentation only bloats it
+    output_path.write_bytes(orjson.dumps(index))
+
     print(f"✅ Created simple index with {len(documents)} quotes")
     return output_path
 
@@ -18,32 +18,28 @@ This script:
 """
 
 import argparse
-import io
 import os
+import random
+import shutil
 import sys
+import tempfile
 import time
 import zipfile
 from pathlib import Path
 
 import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Fix Windows terminal encoding for emoji/Unicode
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
-# Load .env.local
+# Load .env.local; override=False keeps already-exported variables, same
+# as the old setdefault behaviour
 script_dir = Path(__file__).parent.parent
-env_file = script_dir / '.env.local'
-if env_file.exists():
-    try:
-        content = env_file.read_text(encoding='utf-8-sig')
-    except UnicodeDecodeError:
-        content = env_file.read_text(encoding='utf-16')
-    for line in content.strip().split('\n'):
-        line = line.strip()
-        if line and '=' in line and not line.startswith('#'):
-            key, value = line.split('=', 1)
-            os.environ.setdefault(key.strip(), value.strip())
+load_dotenv(script_dir / '.env.local', override=False)
 
 
 def get_config():
@@ -65,16 +61,21 @@ def get_config():
         print(f"   Add them to .env.local or set as environment variables.")
         sys.exit(1)
 
-    return token, datacenter, survey_id
+    # One keep-alive session for the whole export flow: polling reuses
+    # the TLS connection, and urllib3 Retry absorbs transient 429/5xx
+    session = requests.Session()
+    session.headers.update({"X-API-TOKEN": token})
+    retry = Retry(total=5, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET', 'POST'))
+    session.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=4))
+
+    return session, datacenter, survey_id
 
 
-def create_export(token: str, datacenter: str, survey_id: str) -> str:
+def create_export(session: requests.Session, datacenter: str, survey_id: str) -> str:
     """Step 1: Create a response export job. Returns progressId."""
     url = f"https://{datacenter}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses"
-    headers = {
-        "X-API-TOKEN": token,
-        "Content-Type": "application/json",
-    }
     payload = {
         "format": "csv",
         "compress": True,
@@ -82,7 +83,7 @@ def create_export(token: str, datacenter: str, survey_id: str) -> str:
     }
 
     print(f"  Creating export job...")
-    resp = requests.post(url, json=payload, headers=headers, timeout=30)
+    resp = session.post(url, json=payload, timeout=30)
 
     if resp.status_code != 200:
         print(f"❌ Failed to create export: {resp.status_code}")
@@ -101,16 +102,20 @@ def create_export(token: str, datacenter: str, survey_id: str) -> str:
     return progress_id
 
 
-def poll_export(token: str, datacenter: str, survey_id: str, progress_id: str) -> str:
+def poll_export(session: requests.Session, datacenter: str, survey_id: str, progress_id: str) -> str:
     """Step 2: Poll until export completes. Returns fileId."""
     url = f"https://{datacenter}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses/{progress_id}"
-    headers = {"X-API-TOKEN": token}
 
     print(f"  Polling for completion", end="", flush=True)
 
-    max_polls = 60  # 60 × 2s = 2 minutes max
-    for attempt in range(max_polls):
-        resp = requests.get(url, headers=headers, timeout=30)
+    # Exponential backoff with jitter: fast exports are caught within
+    # ~200ms, slow ones poll less often; budget is wall-clock, not a
+    # fixed attempt count
+    budget = 300.0  # seconds
+    delay = 0.2
+    deadline = time.monotonic() + budget
+    while time.monotonic() < deadline:
+        resp = session.get(url, timeout=30)
 
         if resp.status_code != 200:
             print(f"\n❌ Poll failed: {resp.status_code} — {resp.text}")
@@ -129,45 +134,61 @@ def poll_export(token: str, datacenter: str, survey_id: str, progress_id: str) -
             sys.exit(1)
         else:
             print(f".", end="", flush=True)
-            time.sleep(2)
+            time.sleep(max(0.05, delay + random.uniform(-0.05, 0.05)))
+            delay = min(delay * 1.7, 5.0)
 
-    print(f"\n❌ Timed out waiting for export (>{max_polls * 2}s)")
+    print(f"\n❌ Timed out waiting for export (>{budget:.0f}s)")
     sys.exit(1)
 
 
-def download_export(token: str, datacenter: str, survey_id: str, file_id: str, output_path: Path) -> int:
+def download_export(session: requests.Session, datacenter: str, survey_id: str, file_id: str, output_path: Path) -> int:
     """Step 3: Download the ZIP, extract CSV, save to output_path."""
     url = f"https://{datacenter}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses/{file_id}/file"
-    headers = {"X-API-TOKEN": token}
 
     print(f"  Downloading export...")
-    resp = requests.get(url, headers=headers, timeout=120, stream=True)
+    resp = session.get(url, timeout=120, stream=True)
 
     if resp.status_code != 200:
         print(f"❌ Download failed: {resp.status_code} — {resp.text}")
         sys.exit(1)
 
-    # The response is a ZIP file containing a single CSV
-    zip_bytes = io.BytesIO(resp.content)
-
-    with zipfile.ZipFile(zip_bytes) as zf:
-        csv_files = [f for f in zf.namelist() if f.endswith('.csv')]
-        if not csv_files:
-            print(f"❌ No CSV found in export ZIP. Contents: {zf.namelist()}")
-            sys.exit(1)
-
-        csv_name = csv_files[0]
-        print(f"  Extracting: {csv_name}")
-
-        # Read CSV content and save
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with zf.open(csv_name) as csv_file:
-            csv_content = csv_file.read()
-            output_path.write_bytes(csv_content)
-
-    # Count rows (subtract header rows)
-    line_count = csv_content.decode('utf-8', errors='replace').count('\n') - 1
-    return line_count
+    # The response is a ZIP file containing a single CSV. Stream it to a
+    # temp file so memory stays constant regardless of survey size.
+    # decode_content applies any Content-Encoding (e.g. gzip) during the
+    # copy — resp.raw alone yields transport bytes, not the ZIP.
+    resp.raw.decode_content = True
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp:
+            tmp_path = Path(tmp.name)
+            shutil.copyfileobj(resp.raw, tmp, length=1 << 20)
+
+        with zipfile.ZipFile(tmp_path) as zf:
+            csv_files = [f for f in zf.namelist() if f.endswith('.csv')]
+            if not csv_files:
+                print(f"❌ No CSV found in export ZIP. Contents: {zf.namelist()}")
+                sys.exit(1)
+
+            csv_name = csv_files[0]
+            print(f"  Extracting: {csv_name}")
+
+            # Extract in chunks, counting newlines on the way out instead
+            # of decoding the whole CSV afterwards
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            line_count = 0
+            with zf.open(csv_name) as src, open(output_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(1 << 20)
+                    if not chunk:
+                        break
+                    line_count += chunk.count(b'\n')
+                    dst.write(chunk)
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+    # Subtract the header row
+    return line_count - 1
 
 
 def main():
@@ -183,7 +204,7 @@ def main():
     print(f"🔄 Qualtrics API Response Fetcher")
     print(f"{'='*50}")
 
-    token, datacenter, survey_id = get_config()
+    session, datacenter, survey_id = get_config()
     print(f"  Datacenter: {datacenter}")
     print(f"  Survey:     {survey_id}")
     print(f"  Output:     {output_path}\n")
@@ -191,9 +212,9 @@ def main():
     start = time.time()
 
     # 3-step export process
-    progress_id = create_export(token, datacenter, survey_id)
-    file_id = poll_export(token, datacenter, survey_id, progress_id)
-    row_count = download_export(token, datacenter, survey_id, file_id, output_path)
+    progress_id = create_export(session, datacenter, survey_id)
+    file_id = poll_export(session, datacenter, survey_id, progress_id)
+    row_count = download_export(session, datacenter, survey_id, file_id, output_path)
 
     elapsed = time.time() - start
     print(f"\n{'='*50}")
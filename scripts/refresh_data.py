@@ -17,9 +17,12 @@ After running, just push to GitHub and Vercel auto-deploys.
 """
 
 import argparse
+import importlib
 import subprocess
 import sys
 import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Fix Windows terminal encoding for emoji/Unicode
@@ -41,15 +44,45 @@ def run_step(name: str, cmd: list[str]) -> bool:
     print(f"\n{'='*60}")
     print(f"  STEP: {name}")
     print(f"{'='*60}\n")
-    
+
     start = time.time()
     result = subprocess.run(cmd, cwd=str(PROJECT_ROOT))
     elapsed = time.time() - start
-    
+
     if result.returncode != 0:
         print(f"\n❌ FAILED: {name} (exit code {result.returncode})")
         return False
-    
+
+    print(f"\n✅ {name} completed in {elapsed:.1f}s")
+    return True
+
+
+def run_step_inproc(name: str, module_name: str, **step_args) -> bool:
+    """Run a pipeline step in-process via its module's run(args).
+
+    Skips spawning a fresh interpreter (and re-importing pandas/numpy)
+    per step; SystemExit and exceptions map to the same failure handling
+    as the subprocess path.
+    """
+    print(f"\n{'='*60}")
+    print(f"  STEP: {name}")
+    print(f"{'='*60}\n")
+
+    start = time.time()
+    try:
+        module = importlib.import_module(module_name)
+        code = module.run(argparse.Namespace(**step_args))
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else 1
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    elapsed = time.time() - start
+
+    if code:
+        print(f"\n❌ FAILED: {name} (exit code {code})")
+        return False
+
     print(f"\n✅ {name} completed in {elapsed:.1f}s")
     return True
 
@@ -82,7 +115,12 @@ def main():
     
     python = sys.executable
     total_start = time.time()
-    
+
+    # Create every output directory up front in one pass, so individual
+    # steps don't each re-stat and re-create their parents
+    for directory in (DATA_DIR, DATA_DIR / 'raw', ARTIFACTS_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+
     # Step 0 (optional): Fetch from Qualtrics API
     if args.fetch:
         success = run_step(
@@ -113,26 +151,33 @@ def main():
     print(f"   Output: {ARTIFACTS_DIR}/")
     
     # Step 1: Clean raw data
-    success = run_step(
-        "Clean Qualtrics Data",
-        [python, str(SCRIPTS_DIR / 'load_qualtrics.py'),
-         '--input', str(input_path),
-         '--output', str(clean_csv)]
-    )
+    success = run_step_inproc(
+        "Clean Qualtrics Data", 'load_qualtrics',
+        input=str(input_path), output=str(clean_csv))
     if not success:
         sys.exit(1)
     
-    # Step 2: Build metrics rollups
-    success = run_step(
-        "Build Metrics & Rollups",
-        [python, str(SCRIPTS_DIR / 'build_rollups.py'),
-         '--input', str(clean_csv),
-         '--output', str(ARTIFACTS_DIR)]
-    )
-    if not success:
+    # Steps 2+3: rollups and themes both read clean.csv and write
+    # independent artifacts, so they run concurrently — total time is
+    # max(rollups, themes) instead of their sum
+    themes_future = None
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        rollups_future = pool.submit(
+            run_step_inproc,
+            "Build Metrics & Rollups", 'build_rollups',
+            input=str(clean_csv), output=str(ARTIFACTS_DIR), chunksize=0)
+        if not args.skip_themes:
+            themes_future = pool.submit(
+                run_step_inproc,
+                "LLM Thematic Analysis (Gemini 2.5 Pro)", 'build_themes_llm',
+                input=str(clean_csv),
+                output=str(ARTIFACTS_DIR / 'themes.json'))
+        rollups_ok = rollups_future.result()
+        themes_ok = themes_future.result() if themes_future else True
+
+    if not rollups_ok:
         sys.exit(1)
-    
-    # Step 3: Build themes (optional, calls Gemini API)
+
     if args.skip_themes:
         print(f"\n⏭️  Skipping theme building (--skip-themes flag)")
         themes_path = ARTIFACTS_DIR / 'themes.json'
@@ -140,16 +185,9 @@ def main():
             print(f"   Using existing: {themes_path}")
         else:
             print(f"   ⚠️  Warning: {themes_path} does not exist!")
-    else:
-        success = run_step(
-            "LLM Thematic Analysis (Gemini 2.5 Pro)",
-            [python, str(SCRIPTS_DIR / 'build_themes_llm.py'),
-             '--input', str(clean_csv),
-             '--output', str(ARTIFACTS_DIR / 'themes.json')]
-        )
-        if not success:
-            print("\n⚠️  Theme analysis failed. Metrics are still updated.")
-            print("    You can retry with: python scripts/build_themes_llm.py -i data/clean.csv -o artifacts/themes.json")
+    elif not themes_ok:
+        print("\n⚠️  Theme analysis failed. Metrics are still updated.")
+        print("    You can retry with: python scripts/build_themes_llm.py -i data/clean.csv -o artifacts/themes.json")
     
     # Summary
     total_elapsed = time.time() - total_start
@@ -9,14 +9,24 @@ It embeds the query and finds the closest matching comments.
 """
 
 import argparse
-import json
+import functools
+import gzip
+import hashlib
 import os
+import re
 import sys
 from pathlib import Path
 
 import numpy as np
+import orjson
 from dotenv import load_dotenv
 
+# Optional: multi-threaded byte-scan scoring for very large corpora
+try:
+    import numba
+except ImportError:
+    numba = None
+
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -29,24 +39,37 @@ import google.generativeai as genai
 genai.configure(api_key=GEMINI_API_KEY)
 
 
+QUERY_CACHE_DIR = Path(__file__).parent.parent / 'artifacts' / 'query_cache'
+
+
+@functools.lru_cache(maxsize=256)
 def embed_query(query: str) -> np.ndarray:
-    """Embed a search query."""
+    """Embed a search query, caching results on disk and in-process.
+
+    Repeated searches (interactive exploration, tests) load a small .npy
+    keyed by the query hash instead of re-hitting the API.
+    """
+    key = hashlib.sha256(query.encode()).hexdigest()
+    cache_path = QUERY_CACHE_DIR / f'{key}.npy'
+    if cache_path.exists():
+        return np.load(cache_path)
+
     result = genai.embed_content(
         model="models/text-embedding-004",
         content=query,
         task_type="retrieval_query"
     )
-    return np.array(result['embedding'])
+    emb = np.array(result['embedding'])
+    try:
+        QUERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        np.save(cache_path, emb)
+    except OSError:
+        pass
+    return emb
 
 
-def search_themes(themes: list[dict], query: str, top_k: int = 10) -> list[dict]:
-    """
-    Search through theme quotes for matches.
-    
-    Note: For production, we'd store embeddings in a vector DB.
-    This is a simplified version that uses keyword matching + LLM reranking.
-    """
-    # Collect all quotes with metadata
+def _collect_quotes(themes: list[dict]) -> tuple[list[dict], tuple[str, ...]]:
+    """Flatten themes into quote records plus pre-lowered texts."""
     all_quotes = []
     for theme in themes:
         for quote in theme.get('quotes', []):
@@ -55,55 +78,209 @@ def search_themes(themes: list[dict], query: str, top_k: int = 10) -> list[dict]
                 'theme': theme['label'],
                 'theme_id': theme['id'],
             })
-    
-    # Simple keyword matching first
-    query_lower = query.lower()
-    query_terms = query_lower.split()
-    
-    scored_quotes = []
-    for item in all_quotes:
-        text_lower = item['text'].lower()
-        # Score by keyword matches
-        score = sum(1 for term in query_terms if term in text_lower)
-        if score > 0:
-            scored_quotes.append({**item, 'score': score})
-    
-    # Sort by score
-    scored_quotes.sort(key=lambda x: x['score'], reverse=True)
-    
-    return scored_quotes[:top_k]
+    return all_quotes, tuple(q['text'].lower() for q in all_quotes)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_quote_index(path_str: str, mtime: float) -> tuple[list[dict], tuple[str, ...]]:
+    """Load and flatten a themes.json, cached per (path, mtime).
+
+    Long-running search processes skip the repeated JSON parse and
+    lowercase pass; the mtime key invalidates on file change.
+    """
+    data = orjson.loads(Path(path_str).read_bytes())
+    return _collect_quotes(data.get('themes', []))
+
+
+# Single-threaded regex is plenty below this; above it, the numba kernel
+# splits the byte scan across cores
+_NUMBA_MIN_QUOTES = 50_000
+
+
+@functools.lru_cache(maxsize=4)
+def _pack_quotes(lowers: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack lowered texts into one NUL-separated byte buffer + offsets."""
+    encoded = [t.encode('utf-8') + b'\x00' for t in lowers]
+    buf = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64,
+                          count=len(encoded)), out=offsets[1:])
+    return buf, offsets
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _is_word_byte(b):
+        return (97 <= b <= 122) or (48 <= b <= 57) or b == 95
+
+    @numba.njit(parallel=True, cache=True)
+    def _count_terms(buf, offsets, terms, term_lens, out):  # pragma: no cover
+        """Count word-bounded term hits per quote, one prange row each.
+
+        Boundaries are ASCII word bytes on the lowered UTF-8 buffer —
+        close enough to re's \\b for scoring purposes.
+        """
+        for i in numba.prange(offsets.shape[0] - 1):
+            start = offsets[i]
+            end = offsets[i + 1] - 1  # exclude the NUL separator
+            total = 0
+            for t in range(term_lens.shape[0]):
+                tlen = term_lens[t]
+                j = start
+                while j + tlen <= end:
+                    k = 0
+                    while k < tlen and buf[j + k] == terms[t, k]:
+                        k += 1
+                    if (k == tlen
+                            and (j == start or not _is_word_byte(buf[j - 1]))
+                            and (j + tlen == end
+                                 or not _is_word_byte(buf[j + tlen]))):
+                        total += 1
+                        j += tlen
+                    else:
+                        j += 1
+            out[i] = total
+
+
+def _score_quotes_numba(lowers: tuple[str, ...],
+                        query_terms: list[str]) -> np.ndarray:
+    buf, offsets = _pack_quotes(lowers)
+    encoded = [t.encode('utf-8') for t in query_terms]
+    terms = np.zeros((len(encoded), max(map(len, encoded))), dtype=np.uint8)
+    for ti, tb in enumerate(encoded):
+        terms[ti, :len(tb)] = np.frombuffer(tb, dtype=np.uint8)
+    term_lens = np.fromiter(map(len, encoded), dtype=np.int64,
+                            count=len(encoded))
+    scores = np.zeros(len(lowers), dtype=np.int64)
+    _count_terms(buf, offsets, terms, term_lens, scores)
+    return scores
+
+
+def _score_quotes(all_quotes: list[dict], lowers: tuple[str, ...],
+                  query: str, top_k: int) -> list[dict]:
+    query_terms = [t for t in query.lower().split() if t]
+    if not all_quotes or not query_terms:
+        return []
+
+    if numba is not None and len(all_quotes) > _NUMBA_MIN_QUOTES:
+        scores = _score_quotes_numba(lowers, query_terms)
+    else:
+        # One compiled alternation scores every quote in C instead of a
+        # per-term Python loop, and argpartition keeps top-k selection O(n)
+        pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(t) for t in query_terms) + r')\b')
+        scores = np.fromiter((len(pattern.findall(t)) for t in lowers),
+                             dtype=np.int32, count=len(lowers))
+
+    k = min(top_k, len(scores))
+    if k < len(scores):
+        idx = np.argpartition(-scores, k)[:k]
+    else:
+        idx = np.arange(len(scores))
+    idx = idx[np.argsort(-scores[idx], kind='stable')]
+
+    return [{**all_quotes[i], 'score': int(scores[i])} for i in idx
+            if scores[i] > 0]
+
+
+def search_themes(themes: list[dict], query: str, top_k: int = 10) -> list[dict]:
+    """
+    Search through theme quotes for matches.
+
+    Note: For production, we'd store embeddings in a vector DB.
+    This is a simplified version that uses keyword matching + LLM reranking.
+    """
+    all_quotes, lowers = _collect_quotes(themes)
+    return _score_quotes(all_quotes, lowers, query, top_k)
+
+
+def search_themes_file(themes_path: Path, query: str, top_k: int = 10) -> list[dict]:
+    """Search a themes.json on disk, reusing the cached quote index."""
+    all_quotes, lowers = _load_quote_index(str(themes_path),
+                                           themes_path.stat().st_mtime)
+    return _score_quotes(all_quotes, lowers, query, top_k)
+
+
+def _load_embedding_matrix(embeddings_path: Path) -> tuple[list[dict], np.ndarray]:
+    """Load item metadata plus a row-normalized float32 embedding matrix.
+
+    The matrix and metadata are cached as sidecar files next to the JSON
+    (.npy + .meta.json); subsequent runs memory-map the matrix and skip
+    parsing the embeddings out of JSON entirely.
+    """
+    # build_embeddings_index output: normalized float16 matrix in an .npz
+    # sidecar plus gzipped metadata with a documents list — no embeddings
+    # in the JSON at all, so use them directly
+    npz_path = embeddings_path.with_suffix('.npz')
+    gz_path = Path(str(embeddings_path) + '.gz')
+    if npz_path.exists():
+        matrix = np.load(npz_path, mmap_mode='r')['embeddings']
+        meta_src = gz_path if gz_path.exists() else embeddings_path
+        if meta_src.suffix == '.gz':
+            data = orjson.loads(gzip.open(meta_src, 'rb').read())
+        else:
+            data = orjson.loads(meta_src.read_bytes())
+        items = [{'text': d.get('text', ''),
+                  'theme': d.get('theme', d.get('source', ''))}
+                 for d in data.get('documents', [])]
+        return items, matrix
+
+    npy_path = embeddings_path.with_suffix('.npy')
+    meta_path = embeddings_path.with_suffix('.meta.json')
+    src_mtime = embeddings_path.stat().st_mtime
+    if (npy_path.exists() and meta_path.exists()
+            and npy_path.stat().st_mtime >= src_mtime):
+        items = orjson.loads(meta_path.read_bytes())
+        return items, np.load(npy_path, mmap_mode='r')
+
+    data = orjson.loads(embeddings_path.read_bytes())
+    raw = data.get('items', [])
+    items = [{'text': it['text'], 'theme': it.get('theme', '')} for it in raw]
+    matrix = np.asarray([it['embedding'] for it in raw], dtype=np.float32)
+    if len(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+    try:
+        np.save(npy_path, matrix)
+        meta_path.write_bytes(orjson.dumps(items))
+    except OSError:
+        pass
+    return items, matrix
 
 
 def semantic_search(query: str, embeddings_path: Path, top_k: int = 10) -> list[dict]:
     """
     Full semantic search using stored embeddings.
-    
-    Requires embeddings to be pre-computed and stored.
+
+    Requires embeddings to be pre-computed and stored. Similarities come
+    from one matrix-vector product over the normalized matrix instead of
+    a per-item cosine loop.
     """
-    if not embeddings_path.exists():
+    if not (embeddings_path.exists()
+            or embeddings_path.with_suffix('.npz').exists()):
         print(f"Warning: Embeddings not found at {embeddings_path}")
         return []
-    
-    with open(embeddings_path) as f:
-        data = json.load(f)
-    
-    query_embedding = embed_query(query)
-    
-    results = []
-    for item in data.get('items', []):
-        emb = np.array(item['embedding'])
-        # Cosine similarity
-        similarity = np.dot(query_embedding, emb) / (
-            np.linalg.norm(query_embedding) * np.linalg.norm(emb)
-        )
-        results.append({
-            'text': item['text'],
-            'theme': item.get('theme', ''),
-            'similarity': float(similarity),
-        })
-    
-    results.sort(key=lambda x: x['similarity'], reverse=True)
-    return results[:top_k]
+
+    items, matrix = _load_embedding_matrix(embeddings_path)
+    if not items:
+        return []
+
+    q = embed_query(query).astype(np.float32)
+    qn = np.linalg.norm(q)
+    if qn > 0:
+        q /= qn
+
+    sims = matrix @ q
+    k = min(top_k, len(sims))
+    if k < len(sims):
+        idx = np.argpartition(-sims, k)[:k]
+    else:
+        idx = np.arange(len(sims))
+    idx = idx[np.argsort(-sims[idx], kind='stable')]
+
+    return [{'text': items[i]['text'], 'theme': items[i]['theme'],
+             'similarity': float(sims[i])} for i in idx]
 
 
 def main():
@@ -118,10 +295,7 @@ def main():
         print(f"Error: Themes file not found: {themes_path}")
         sys.exit(1)
     
-    with open(themes_path) as f:
-        data = json.load(f)
-    
-    results = search_themes(data.get('themes', []), args.query, args.top)
+    results = search_themes_file(themes_path, args.query, args.top)
     
     print(f"\n🔍 Search: \"{args.query}\"\n")
     print(f"Found {len(results)} matching quotes:\n")